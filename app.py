@@ -1,14 +1,16 @@
 # app.py
 import streamlit as st
 import pandas as pd
-import numpy as np
 import plotly.express as px
 
 
 # --- Importações dos Módulos ---
 from config import *
 from styles import estetica_avancada
-from database import carregar_dados_mysql, carregar_google_trends
+from database import carregar_dados_iniciais, buscar_titulos, obter_titulos
+from consultas import agregar
+from filtros import construir_indice
+from cache_analises import memoizar, cache_analises
 from utils import (
     formatar_numero_br, formatar_porcentagem_br, extrair_palavras_chave, 
     gerar_gradiente_hex, atualizar_layout_grafico, plotar_grafico_linha, 
@@ -21,8 +23,10 @@ st.set_page_config(layout="wide", page_title="Tiktok and Youtube Shorts Analytic
 estetica_avancada() 
 
 # --- Carga de Dados ---
-df_original = carregar_dados_mysql()
-df_trends = carregar_google_trends()
+barra_carga = st.progress(0.0, text="Carregando dados...")
+df_original, df_trends = carregar_dados_iniciais(barra_carga.progress)
+barra_carga.empty()
+indice = construir_indice(df_original.attrs.get('versao'), df_original, DIMENSOES_FILTRO)
 
 
 # --- BARRA LATERAL  ---
@@ -34,22 +38,41 @@ with st.sidebar:
         st.rerun()
     st.markdown("<br>", unsafe_allow_html=True)
     with st.expander("⚙️Filtragem Principal", expanded=True):
-        paises_disp = sorted(df_original['country'].unique())
+        paises_disp = indice.valores('country')
         sel_paises = st.multiselect("Países", options=paises_disp, placeholder="Todos os países") or paises_disp
-        plats_disp = sorted(df_original['platform'].unique())
+        plats_disp = indice.valores('platform')
         sel_plats = st.multiselect("Plataformas", options=plats_disp, placeholder="Todas as plataformas") or plats_disp
     with st.expander("📳Filtrar Device", expanded=False):
-        dev_disp = sorted(df_original['device_type'].unique())
+        dev_disp = indice.valores('device_type')
         sel_devs = st.multiselect("Dispositivos", options=dev_disp, placeholder="Todos os dispositivos") or dev_disp
     st.markdown("---")
     st.caption("v3.2 • Viral Analytics")
+    uso_cache = cache_analises().estatisticas()
+    st.caption(f"Cache de análises: {uso_cache['acertos']} acertos • {uso_cache['falhas']} cálculos • {uso_cache['itens']}/{uso_cache['tamanho']} itens")
 
 # Aplicação dos Filtros
-df_filtrado = df_original.query("country in @sel_paises and platform in @sel_plats and device_type in @sel_devs")
+mascara = indice.mascara({'country': sel_paises, 'platform': sel_plats, 'device_type': sel_devs})
+df_filtrado = df_original[mascara]
 if df_filtrado.empty:
     st.warning("⚠️ Nenhum dado encontrado com os filtros atuais.")
     st.stop()
 
+# Filtros ativos (seleções parciais), enviados às agregações feitas no banco
+filtros = {
+    col: sel for col, sel, disp in [('country', sel_paises, paises_disp), ('platform', sel_plats, plats_disp), ('device_type', sel_devs, dev_disp)]
+    if len(sel) < len(disp)
+}
+# Chave das análises em cache: versão dos dados + filtros ativos
+contexto = (df_original.attrs.get('versao'), filtros)
+
+# Análises de títulos numa entrada só do LRU: os títulos das linhas filtradas são buscados uma vez,
+# e só quando o resultado não está no cache (o LRU guarda palavras/termos, não os títulos).
+# Se a busca falhar a exceção sobe sem passar pelo LRU, para o resultado vazio não ficar guardado
+def analisar_titulos():
+    titulos = buscar_titulos(df_filtrado['row_id'], df_original.attrs.get('versao'))
+    return {'palavras': extrair_palavras_chave(titulos.dropna(), top_n=50),
+            'termos': extrair_termos_engajamento(titulos, df_filtrado['engagement_rate'], top_n=10)}
+
 # --- Interface Principal ---
 st.title("📲 Tiktok and Youtube Shorts Analytics")
 st.markdown("##### Quais fatores influenciam o sucesso viral nas plataformas de vídeos curtos ?")
@@ -68,10 +91,14 @@ with tab1:
     st.markdown("### Indicadores Gerais")
     
     # KPIs Gerais
-    vis_totais = df_filtrado['views'].sum()
-    eng_medio = df_filtrado['engagement_rate'].mean()
-    likes_totais = df_filtrado['likes'].sum()
-    total_videos = len(df_filtrado)
+    kpis = memoizar('agregar', contexto, agregar, df_filtrado, filtros, [], {
+        'views': ('views', 'sum'), 'engagement_rate': ('engagement_rate', 'mean'),
+        'likes': ('likes', 'sum'), 'qtd_videos': ('row_id', 'count')
+    }).iloc[0]
+    vis_totais = kpis['views']
+    eng_medio = kpis['engagement_rate']
+    likes_totais = kpis['likes']
+    total_videos = kpis['qtd_videos']
     
     c1, c2, c3, c4 = st.columns(4)
     c1.metric("Visualizações Totais", formatar_numero_br(vis_totais))
@@ -87,8 +114,7 @@ with tab1:
         st.markdown("#### Volume e Performance")
         
         # 1. Quantidade de Postagem por Mês
-        df_qtd_videos = df_filtrado.groupby('year_month')['row_id'].count().reset_index()
-        df_qtd_videos.columns = ['year_month', 'qtd_videos']
+        df_qtd_videos = memoizar('agregar', contexto, agregar, df_filtrado, filtros, ['year_month'], {'qtd_videos': ('row_id', 'count')})
         df_qtd_videos['year_month'] = df_qtd_videos['year_month'].astype(str)
         
         plotar_grafico_barra(
@@ -104,7 +130,7 @@ with tab1:
         st.divider()
 
         # 2. Somatório de Visualizações por Plataforma
-        df_views_plat = df_filtrado.groupby('platform')['views'].sum().reset_index()
+        df_views_plat = memoizar('agregar', contexto, agregar, df_filtrado, filtros, ['platform'], {'views': ('views', 'sum')})
 
         fig_pie = px.pie(
             df_views_plat, 
@@ -129,10 +155,10 @@ with tab1:
 
         # 3. Tendência de Engajamento
         plotar_grafico_linha(
-            df=df_filtrado,
+            df=memoizar('agregar', contexto, agregar, df_filtrado, filtros, ['year_month'], {'engagement_rate': ('engagement_rate', 'mean')}),
             x_col='year_month', 
             y_col='engagement_rate', 
-            agg_func='mean',
+            agg_func=None,
             titulo='Taxa de Engajamento por Mês',
             cor=SECONDARY_COLOR,
             zoom_inteligente=True,
@@ -145,7 +171,7 @@ with tab1:
         st.markdown("#### Importância dos Fatores para o Engajamento")
         try:
             with st.spinner("Treinando modelo..."):
-                df_imp = calcular_importancia_fatores(df_filtrado)
+                df_imp = memoizar('importancia', contexto, calcular_importancia_fatores, df_filtrado)
                 plotar_grafico_barra(
                     df_imp, 
                     'Fator', 
@@ -164,10 +190,10 @@ with tab2:
     
     with col1:
         plotar_grafico_linha(
-            df_filtrado, 
+            memoizar('agregar', contexto, agregar, df_filtrado, filtros, ['upload_hour'], {'engagement_rate': ('engagement_rate', 'mean')}), 
             'upload_hour', 
             'engagement_rate', 
-            'mean', 
+            None, 
             'Melhor Horário de Postagem', 
             cor='#9A10BC', 
             formato_eixo='.2%', 
@@ -175,7 +201,7 @@ with tab2:
             zoom_inteligente=True
         )
         
-        df_cat = df_filtrado.groupby('category')['engagement_total'].mean().reset_index().sort_values(by='engagement_total', ascending=False)
+        df_cat = memoizar('agregar', contexto, agregar, df_filtrado, filtros, ['category'], {'engagement_total': ('engagement_total', 'mean')}).sort_values(by='engagement_total', ascending=False)
         cores = gerar_gradiente_hex(PRIMARY_COLOR, len(df_cat), valores=df_cat['engagement_total'])
         
         fig_cat = px.bar(
@@ -198,10 +224,8 @@ with tab2:
         st.plotly_chart(atualizar_layout_grafico(fig_cat), use_container_width=True)
         
     with col2:
-        bins = [0, 15, 30, 60, 120, np.inf]
-        labels = ['0-15s', '15-30s', '30-60s', '60-120s', '>120s']
-        df_filtrado['duration_bin'] = pd.cut(df_filtrado['duration_sec'], bins=bins, labels=labels)
-        df_dur = df_filtrado.groupby('duration_bin', observed=True)['engagement_rate'].mean().reset_index()
+        df_filtrado['duration_bin'] = pd.cut(df_filtrado['duration_sec'], bins=DURATION_BINS, labels=DURATION_LABELS)
+        df_dur = memoizar('agregar', contexto, agregar, df_filtrado, filtros, ['duration_bin'], {'engagement_rate': ('engagement_rate', 'mean')})
         
         cores_dur = gerar_gradiente_hex(SECONDARY_COLOR, len(df_dur), valores=df_dur['engagement_rate'])
         
@@ -209,7 +233,8 @@ with tab2:
         
         # Preparação dos dados de Dia da Semana
         dias_ordem = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-        df_day = df_filtrado.groupby('publish_dayofweek')['engagement_rate'].mean().reindex(dias_ordem).reset_index()
+        df_day = memoizar('agregar', contexto, agregar, df_filtrado, filtros, ['publish_dayofweek'], {'engagement_rate': ('engagement_rate', 'mean')})
+        df_day = df_day.set_index('publish_dayofweek')['engagement_rate'].reindex(dias_ordem).reset_index()
         
         cores_day = gerar_gradiente_hex('#fb5607', len(df_day), valores=df_day['engagement_rate'])
         
@@ -236,20 +261,26 @@ with tab3:
     st.markdown("### Análise de Conteúdo e Testes A/B")
     
     # --- BLOCO 1: ANÁLISE DOS TERMOS/TEXTO ---
+    # Títulos ficam fora da carga principal; o LRU guarda só o resultado (palavras/termos), não os títulos
+    try:
+        analise_titulos = memoizar('titulos', contexto, analisar_titulos)
+    except Exception as e:
+        st.error(f"Erro ao carregar títulos: {e}")
+        analise_titulos = {'palavras': [], 'termos': pd.DataFrame(columns=['Termo', 'Contagem', 'Engajamento_Medio'])}
     st.markdown("#### Análise de Termos presentes nos Títulos")
     col_termos1, col_termos2 = st.columns(2)
     
     with col_termos1:
         st.markdown("##### 🔠 Frequência de Termos")
         if not df_filtrado.empty:
-            top_words = extrair_palavras_chave(df_filtrado['title'].dropna().tolist(), top_n=10)
+            top_words = analise_titulos['palavras'][:10]
             df_words = pd.DataFrame(top_words, columns=['Palavra', 'Frequência']).sort_values(by='Frequência', ascending=True)
             plotar_grafico_barra(df_words, 'Frequência', 'Palavra', 'Top 10 Termos Frequentes', cor='#3a86ff', orientation='h')
             
     with col_termos2:
         st.markdown("##### 🚀 Performance por Termo")
         if not df_filtrado.empty:
-            df_termos_eng = extrair_termos_engajamento(df_filtrado['title'], df_filtrado['engagement_rate'], top_n=10)
+            df_termos_eng = analise_titulos['termos']
             if not df_termos_eng.empty:
                 plotar_grafico_barra(df_termos_eng.sort_values('Engajamento_Medio', ascending=True), 'Engajamento_Medio', 'Termo', 'Engajamento Médio por Termo', cor='#ff006e', orientation='h', formato_eixo='.2%')
 
@@ -260,13 +291,13 @@ with tab3:
     col_ab_metrica, col_ab_grafico = st.columns([1, 2.5])
 
     with col_ab_metrica:
-        df_ab = testar_ab_emoji(df_filtrado)
+        df_ab = memoizar('ab_emoji', contexto, testar_ab_emoji, df_filtrado)
         eng_com = df_ab[df_ab['has_emoji'] == 1]['engagement_rate'].values[0] if not df_ab[df_ab['has_emoji'] == 1].empty else 0
         eng_sem = df_ab[df_ab['has_emoji'] == 0]['engagement_rate'].values[0] if not df_ab[df_ab['has_emoji'] == 0].empty else 0
         diff = (eng_com - eng_sem) / eng_sem if eng_sem > 0 else 0
         st.metric(label="Média com Emoji", value=formatar_porcentagem_br(eng_com), delta=f"{diff:.1%} vs Texto")
         
-        t_stat, p_valor = calcular_estatisticas_ab(df_filtrado, 'has_emoji', 'engagement_rate')
+        t_stat, p_valor = memoizar('ab_emoji_stats', contexto, calcular_estatisticas_ab, df_filtrado, 'has_emoji', 'engagement_rate')
         if p_valor is not None:
             st.markdown("---")
             is_significant = p_valor < 0.05
@@ -301,7 +332,7 @@ with tab3:
                 st.metric("Performance de Hits", formatar_porcentagem_br(avg_hit), delta=f"{diff_mus:.1%} vs Outros")
             
             # Cálculo de Significância
-            t_mus, p_mus = calcular_estatisticas_ab(df_audio, 'is_global_hit', 'engagement_rate')
+            t_mus, p_mus = memoizar('ab_musica_stats', contexto, calcular_estatisticas_ab, df_audio, 'is_global_hit', 'engagement_rate')
             if p_mus is not None:
                 st.markdown("---")
                 is_significant_mus = p_mus < 0.05
@@ -331,20 +362,21 @@ with tab3:
 with tab4:
     st.markdown("### Análises Geográficas de Performance e Engajamento")
     st.subheader("Mapa de Calor Global (Visualizações)")
-    df_map = df_filtrado.groupby('country')['views'].sum().reset_index()
+    df_map = memoizar('agregar', contexto, agregar, df_filtrado, filtros, ['country'], {'views': ('views', 'sum')})
     df_map['iso_alpha'] = df_map['country'].str.upper().map(ISO2_TO_ISO3)
     fig_map = px.choropleth(df_map, locations="iso_alpha", color="views", hover_name="country", color_continuous_scale="Purples", labels=LABELS_PT)
     fig_map.update_geos(bgcolor='rgba(0,0,0,0)', showocean=True, oceancolor="rgba(20, 20, 40, 0.5)", showlakes=True, lakecolor="rgba(20, 20, 40, 0.5)", showcountries=True, countrycolor="#444")
     st.plotly_chart(atualizar_layout_grafico(fig_map), use_container_width=True)
     st.divider()
     st.subheader("Performance Relativa")
-    df_geo = df_filtrado.groupby('country').agg(avg_views=('views', 'mean'), avg_eng=('engagement_rate', 'mean'), count=('row_id', 'count')).reset_index()
+    df_geo = memoizar('agregar', contexto, agregar, df_filtrado, filtros, ['country'], {'avg_views': ('views', 'mean'), 'avg_eng': ('engagement_rate', 'mean'), 'count': ('row_id', 'count')})
     fig_scatter = px.scatter(df_geo, x='avg_views', y='avg_eng', size='count', color='country', log_x=True, size_max=60, hover_name='country', text='country', labels=LABELS_PT, title="Views vs Engajamento")
     fig_scatter.update_traces(textposition='middle center', textfont=dict(color='white', weight='bold'))
     st.plotly_chart(atualizar_layout_grafico(fig_scatter), use_container_width=True)
     st.divider()
     st.subheader("Intensidade: Região vs Categoria")
-    pivot_table = df_filtrado.pivot_table(values='engagement_rate', index='region', columns='category', aggfunc='mean')
+    df_reg_cat = memoizar('agregar', contexto, agregar, df_filtrado, filtros, ['region', 'category'], {'engagement_rate': ('engagement_rate', 'mean')})
+    pivot_table = df_reg_cat.pivot_table(values='engagement_rate', index='region', columns='category', aggfunc='mean', observed=True)
     if not pivot_table.empty:
         fig_heat = px.imshow(pivot_table, text_auto=".2%", aspect="auto", color_continuous_scale='Purples', labels=dict(x="Categoria", y="Região", color="Engajamento"), title="Matriz de Engajamento")
         st.plotly_chart(atualizar_layout_grafico(fig_heat), use_container_width=True)
@@ -353,7 +385,9 @@ with tab4:
 # ABA 5: TOP VIRAIS
 with tab5:
     st.markdown("### Ranking de Views")
-    top_videos = df_filtrado.sort_values(by='views', ascending=False)
+    # Só os títulos exibidos: os LIMITE_TOP_VIRAIS mais vistos
+    top_videos = df_filtrado.sort_values(by='views', ascending=False).head(LIMITE_TOP_VIRAIS)
+    top_videos = top_videos.assign(title=obter_titulos(top_videos['row_id'], df_original.attrs.get('versao')))
     if len(top_videos) >= 3:
         cols = st.columns(3)
         colors = [('#FFD700', '🥇 1º Lugar'), ('#C0C0C0', '🥈 2º Lugar'), ('#CD7F32', '🥉 3º Lugar')]
@@ -361,7 +395,7 @@ with tab5:
             v = top_videos.iloc[i]
             col.markdown(f"""<div style="background: rgba{tuple(int(color[1:][i:i+2], 16) for i in (0, 2, 4)) + (0.1,)}; border: 2px solid {color}; padding: 20px; border-radius: 15px; text-align: center;"><h1 style="color: {color} !important; margin: 0;">{title}</h1><h3 style="margin: 10px 0;">{v['title']}</h3><p style="font-size: 1.5rem; color: white;">{formatar_numero_br(v['views'])} Views</p><p style="color: #bdb2ff;">{v['platform']} • {v['country']}</p></div>""", unsafe_allow_html=True)
     st.divider()
-    st.subheader("📋 Lista Completa")
+    st.subheader("📋 Lista Completa" if len(df_filtrado) <= LIMITE_TOP_VIRAIS else f"📋 Top {LIMITE_TOP_VIRAIS} por Views")
     st.dataframe(top_videos[['title', 'platform', 'country', 'views', 'likes', 'engagement_rate', 'category']], use_container_width=True, column_config={"title": "Título", "views": st.column_config.NumberColumn("Visualizações", format="%d"), "likes": st.column_config.NumberColumn("Likes", format="%d"), "engagement_rate": st.column_config.ProgressColumn("Engajamento", format="%.2f%%", min_value=0, max_value=float(top_videos['engagement_rate'].max())), "category": st.column_config.TextColumn("Categoria", width="medium")}, hide_index=True)
 
 # ABA 6: GOOGLE TRENDS (REFATORADA + FILTRO)
@@ -376,7 +410,7 @@ with tab6:
         palavras_no_trends = set(df_trends['keyword'].unique())
         
         # 2. Palavras que existem nos vídeos FILTRADOS
-        palavras_do_filtro_raw = extrair_palavras_chave(df_filtrado['title'].dropna().tolist(), top_n=50)
+        palavras_do_filtro_raw = analise_titulos['palavras']
         palavras_do_filtro = {item[0] for item in palavras_do_filtro_raw}
         
         # 3. Interseção: Só mostramos palavras que existem nos DOIS mundos
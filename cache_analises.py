@@ -0,0 +1,59 @@
+# cache_analises.py
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+import streamlit as st
+from config import TAMANHO_CACHE_ANALISES
+
+class CacheLRU:
+    """Cache LRU com tamanho máximo e contadores de acertos/falhas, seguro entre threads."""
+    def __init__(self, tamanho):
+        self.tamanho = tamanho
+        self.dados = OrderedDict()
+        self.lock = threading.Lock()
+        self.acertos = 0
+        self.falhas = 0
+
+    def obter_ou_calcular(self, chave, calcular):
+        with self.lock:
+            if chave in self.dados:
+                self.dados.move_to_end(chave)
+                self.acertos += 1
+                return self.dados[chave]
+        valor = calcular()
+        with self.lock:
+            self.falhas += 1
+            self.dados[chave] = valor
+            self.dados.move_to_end(chave)
+            while len(self.dados) > self.tamanho:
+                self.dados.popitem(last=False)
+        return valor
+
+    def estatisticas(self):
+        with self.lock:
+            return {'acertos': self.acertos, 'falhas': self.falhas, 'itens': len(self.dados), 'tamanho': self.tamanho}
+
+@st.cache_resource(show_spinner=False)
+def cache_analises():
+    return CacheLRU(TAMANHO_CACHE_ANALISES)
+
+def chave_estavel(*partes):
+    """Hash estável (independe de ordem de dicionários e da sessão) das partes da chave."""
+    texto = json.dumps(partes, sort_keys=True, default=str)
+    return hashlib.sha1(texto.encode("utf-8")).hexdigest()
+
+def memoizar(nome, contexto, funcao, *args, **kwargs):
+    """
+    Executa funcao(*args, **kwargs) uma vez por (nome, contexto, parâmetros).
+    contexto = (versão dos dados, seleção de filtros). DataFrames, Series e arrays
+    passados como argumento são os dados daquele contexto e não entram na chave.
+    """
+    parametros = [a for a in args if not isinstance(a, (pd.DataFrame, pd.Series, np.ndarray))]
+    parametros.append({k: v for k, v in kwargs.items() if not isinstance(v, (pd.DataFrame, pd.Series, np.ndarray))})
+    chave = chave_estavel(nome, contexto, parametros)
+    valor = cache_analises().obter_ou_calcular(chave, lambda: funcao(*args, **kwargs))
+    # Quem chama pode alterar o DataFrame devolvido (novas colunas etc.)
+    return valor.copy() if isinstance(valor, pd.DataFrame) else valor
@@ -0,0 +1,43 @@
+# conexao.py
+import functools
+from urllib.parse import quote_plus
+from sqlalchemy import create_engine
+from config import DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_RECYCLE, DB_POOL_PRE_PING, DB_POOL_TIMEOUT
+
+def montar_url(user, password, host, port, db):
+    return f"mysql+pymysql://{user}:{quote_plus(password)}@{host}:{port}/{db}"
+
+def criar_engine(user, password, host, port, db, ssl=False, local_infile=False):
+    """
+    Cria uma engine com pool de conexões (pre-ping e recycle evitam conexões mortas no MySQL remoto).
+    local_infile habilita LOAD DATA LOCAL INFILE no cliente (o servidor também precisa permitir).
+    """
+    connect_args = {"ssl": {"ssl_mode": "REQUIRED"}} if ssl else {}
+    if local_infile:
+        connect_args["local_infile"] = True
+    return create_engine(
+        montar_url(user, password, host, port, db),
+        connect_args=connect_args,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+        pool_timeout=DB_POOL_TIMEOUT,
+    )
+
+# Fora do Streamlit (ETL e scrapers) a engine é mantida por processo
+_engine_processo = functools.lru_cache(maxsize=None)(criar_engine)
+
+try:
+    import streamlit as st
+    from streamlit import runtime
+    # No Streamlit a engine é um recurso compartilhado entre todas as sessões
+    _engine_streamlit = st.cache_resource(show_spinner=False)(criar_engine)
+except ImportError:
+    runtime = None
+
+def obter_engine(user, password, host, port, db, ssl=False, local_infile=False):
+    """Retorna a engine compartilhada do processo para o banco informado."""
+    if runtime is not None and runtime.exists():
+        return _engine_streamlit(user, password, host, port, db, ssl, local_infile)
+    return _engine_processo(user, password, host, port, db, ssl, local_infile)
@@ -1,4 +1,39 @@
 # config.py
+import os
+
+# Snapshot local (Parquet) da fato carregada no dashboard
+SNAPSHOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache')
+SNAPSHOT_TTL = 600  # segundos até o snapshot ser considerado desatualizado
+
+TAMANHO_LOTE_CARGA = 50000  # linhas por lote na leitura em streaming da fato
+TAMANHO_LOTE_TEXTO = 1000  # row_ids por consulta IN ao buscar títulos sob demanda
+LIMITE_LEITURA_COMPLETA = 100000  # acima disso é mais barato ler todos os títulos do que fazer IN
+TAMANHO_CACHE_TITULOS = 300000  # títulos guardados entre reruns (os mais antigos saem primeiro)
+LIMITE_TOP_VIRAIS = 1000  # linhas da lista da aba Top Virais (só elas têm o título buscado)
+
+TAMANHO_CACHE_ANALISES = 256  # resultados de análises guardados por (versão dos dados, filtros)
+
+# Pool de conexões compartilhado (conexao.py)
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 5))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 10))
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 1800))  # segundos
+DB_POOL_TIMEOUT = int(os.getenv('DB_POOL_TIMEOUT', 30))
+DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', '1') == '1'
+
+# Onde as agregações do dashboard começam: 'cubo' (pré-agregado pelo ETL), 'sql' (GROUP BY no banco) ou 'pandas'
+MODO_AGREGACAO = os.getenv('MODO_AGREGACAO', 'cubo')
+
+# Schema de carga da fato: dimensões de baixa cardinalidade viram categóricas
+# e contadores/flags são reduzidos ao menor inteiro que comporta os valores
+SCHEMA_CATEGORIAS = ['country', 'platform', 'category', 'device_type', 'region', 'year_month', 'publish_dayofweek', 'music_track']
+SCHEMA_INTEIROS = ['upload_hour', 'has_emoji', 'is_weekend', 'is_global_hit', 'chart_rank']
+
+# Dimensões indexadas para filtragem (filtros.IndiceFiltro)
+DIMENSOES_FILTRO = ('country', 'platform', 'device_type', 'category', 'region', 'year_month')
+
+# Faixas de duração (pd.cut no dashboard, CASE no SQL e no cubo do ETL)
+DURATION_BINS = [0, 15, 30, 60, 120, float('inf')]
+DURATION_LABELS = ['0-15s', '15-30s', '30-60s', '60-120s', '>120s']
 
 # Paleta de Cores
 GERAL_PALETTE = ['#8338ec', '#ff006e', '#fb5607', '#3a86ff', '#ffbe0b']
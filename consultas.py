@@ -0,0 +1,67 @@
+# consultas.py
+import pandas as pd
+import streamlit as st
+from sqlalchemy import text, bindparam
+from config import MODO_AGREGACAO
+from database import get_engine, carregar_cubo
+from cubo import cubo_atende, consultar_cubo, ordenar_dimensoes
+from sql_estrela import JOINS_ESTRELA, DIMENSOES_SQL, METRICAS_SQL
+
+FUNCOES_SQL = {'sum': 'SUM', 'mean': 'AVG', 'count': 'COUNT'}
+
+def montar_consulta(filtros, dimensoes, metricas):
+    """
+    Monta o SELECT ... GROUP BY parametrizado.
+    filtros: {'country': [...]}, dimensoes: ['year_month'], metricas: {'alias': ('coluna', 'sum'|'mean'|'count')}
+    """
+    selects = [f"{DIMENSOES_SQL[d]} AS `{d}`" for d in dimensoes]
+    selects += [f"{FUNCOES_SQL[func]}({METRICAS_SQL[col]}) AS `{alias}`" for alias, (col, func) in metricas.items()]
+
+    condicoes, params, binds = [], {}, []
+    for col, valores in filtros.items():
+        condicoes.append(f"{DIMENSOES_SQL[col]} IN :f_{col}")
+        params[f"f_{col}"] = list(valores)
+        binds.append(bindparam(f"f_{col}", expanding=True))
+
+    sql = f"SELECT {', '.join(selects)} {JOINS_ESTRELA}"
+    if condicoes:
+        sql += " WHERE " + " AND ".join(condicoes)
+    if dimensoes:
+        grupo = ", ".join(DIMENSOES_SQL[d] for d in dimensoes)
+        sql += f" GROUP BY {grupo} ORDER BY {grupo}"
+    return text(sql).bindparams(*binds), params
+
+@st.cache_data(ttl=600, show_spinner=False)
+def agregar_sql(filtros, dimensoes, metricas):
+    consulta, params = montar_consulta(filtros, dimensoes, metricas)
+    with get_engine().connect() as conn:
+        df = pd.read_sql(consulta, conn, params=params)
+    # SUM/AVG do MySQL chegam como Decimal
+    for alias in metricas:
+        df[alias] = pd.to_numeric(df[alias])
+    # groupby do pandas descarta grupos nulos; o GROUP BY não
+    return ordenar_dimensoes(df.dropna(subset=dimensoes), dimensoes)
+
+def agregar_pandas(df, dimensoes, metricas):
+    """Mesma agregação de agregar_sql, calculada sobre o DataFrame já filtrado."""
+    spec = {alias: (col, func) for alias, (col, func) in metricas.items()}
+    if not dimensoes:
+        return pd.DataFrame([{alias: df[col].agg(func) for alias, (col, func) in spec.items()}])
+    return df.groupby(dimensoes, observed=True).agg(**spec).reset_index()
+
+def agregar(df_filtrado, filtros, dimensoes, metricas):
+    """
+    Responde a agregação pela fonte mais barata disponível:
+    cubo pré-agregado do ETL -> GROUP BY no banco -> DataFrame filtrado em memória.
+    MODO_AGREGACAO ('cubo', 'sql' ou 'pandas') define por onde começar.
+    """
+    if MODO_AGREGACAO == 'cubo' and cubo_atende(dimensoes, metricas, filtros):
+        cubo = carregar_cubo()
+        if not cubo.empty:
+            return consultar_cubo(cubo, filtros, list(dimensoes), metricas)
+    if MODO_AGREGACAO in ('cubo', 'sql'):
+        try:
+            return agregar_sql(filtros, list(dimensoes), metricas)
+        except Exception as e:
+            print(f"⚠️ Agregação SQL indisponível, usando pandas: {e}")
+    return agregar_pandas(df_filtrado, list(dimensoes), metricas)
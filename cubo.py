@@ -0,0 +1,106 @@
+# cubo.py
+# Cubo OLAP pré-agregado: construído pelo ETL e lido pelas abas 1, 2 e 4 do dashboard
+import pandas as pd
+from sqlalchemy import inspect, text
+from config import DURATION_LABELS
+from sql_estrela import JOINS_ESTRELA, DIMENSOES_SQL, METRICAS_SQL
+
+TABELA_CUBO = 'agg_video_cubo'
+CHAVES_CUBO = ['country', 'platform', 'device_type']
+METRICAS_CUBO = ['views', 'likes', 'engagement_rate', 'engagement_total']
+# Cada entrada vira um "recorte" do cubo; () guarda o total usado nos KPIs
+DIMENSOES_CUBO = [
+    (), ('year_month',), ('platform',), ('country',), ('upload_hour',), ('publish_dayofweek',),
+    ('duration_bin',), ('category',), ('region',), ('region', 'category'),
+]
+
+def sql_recorte(dimensoes):
+    """SELECT com as estatísticas suficientes (contagem, soma, soma dos quadrados) de um recorte."""
+    chaves = [DIMENSOES_SQL[c] for c in CHAVES_CUBO]
+    exprs = [DIMENSOES_SQL[d] for d in dimensoes]
+    valores = (exprs + ["''", "''"])[:2]
+    selects = [f"{e} AS {c}" for e, c in zip(chaves, CHAVES_CUBO)]
+    selects += [f"'{','.join(dimensoes)}' AS dimensao", f"{valores[0]} AS valor", f"{valores[1]} AS valor_2", "COUNT(*) AS qtd"]
+    for m in METRICAS_CUBO:
+        col = METRICAS_SQL[m]
+        # * 1.0 evita estouro de BIGINT na soma dos quadrados
+        selects += [f"COUNT({col}) AS {m}_n", f"SUM({col}) AS {m}_sum", f"SUM({col} * 1.0 * {col}) AS {m}_sq"]
+    return f"SELECT {', '.join(selects)} {JOINS_ESTRELA} GROUP BY {', '.join(chaves + exprs)}"
+
+def construir_cubo(engine):
+    """Recalcula o cubo no banco e troca a tabela de uma vez, sem deixar o dashboard sem dados."""
+    with engine.connect() as conn:
+        cubo = pd.concat([pd.read_sql(text(sql_recorte(d)), conn) for d in DIMENSOES_CUBO], ignore_index=True)
+    cubo.insert(0, 'id', range(1, len(cubo) + 1))
+
+    colunas = ", ".join(
+        ["id INTEGER PRIMARY KEY", "country VARCHAR(16)", "platform VARCHAR(64)", "device_type VARCHAR(64)",
+         "dimensao VARCHAR(64)", "valor VARCHAR(255)", "valor_2 VARCHAR(255)", "qtd BIGINT"]
+        + [f"{m}_{s} DOUBLE" for m in METRICAS_CUBO for s in ('n', 'sum', 'sq')]
+    )
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP TABLE IF EXISTS {TABELA_CUBO}_novo"))
+        conn.execute(text(f"CREATE TABLE {TABELA_CUBO}_novo ({colunas})"))
+        cubo.to_sql(f'{TABELA_CUBO}_novo', conn, if_exists='append', index=False, chunksize=2000)
+    with engine.begin() as conn:
+        trocar_tabela_cubo(conn)
+    return cubo
+
+def trocar_tabela_cubo(conn):
+    """
+    Põe o cubo novo no lugar do atual sem intervalo em que a tabela não existe.
+    No MySQL o DDL faz commit implícito, então DROP + ALTER deixaria uma janela sem cubo:
+    um único RENAME TABLE com os dois pares é atômico. No SQLite o DDL é transacional.
+    """
+    existe = inspect(conn).has_table(TABELA_CUBO)
+    if conn.dialect.name == 'mysql':
+        conn.execute(text(f"DROP TABLE IF EXISTS {TABELA_CUBO}_antigo"))
+        if existe:
+            conn.execute(text(f"RENAME TABLE {TABELA_CUBO} TO {TABELA_CUBO}_antigo, {TABELA_CUBO}_novo TO {TABELA_CUBO}"))
+            conn.execute(text(f"DROP TABLE {TABELA_CUBO}_antigo"))
+        else:
+            conn.execute(text(f"RENAME TABLE {TABELA_CUBO}_novo TO {TABELA_CUBO}"))
+    else:
+        conn.execute(text(f"DROP TABLE IF EXISTS {TABELA_CUBO}"))
+        conn.execute(text(f"ALTER TABLE {TABELA_CUBO}_novo RENAME TO {TABELA_CUBO}"))
+
+def cubo_atende(dimensoes, metricas, filtros):
+    """O cubo só responde recortes pré-calculados, métricas armazenadas e filtros pelas chaves."""
+    return (tuple(dimensoes) in DIMENSOES_CUBO
+            and all(col == 'row_id' or col in METRICAS_CUBO for col, _ in metricas.values())
+            and set(filtros) <= set(CHAVES_CUBO))
+
+def consultar_cubo(cubo, filtros, dimensoes, metricas):
+    """Reagrega as linhas do cubo para a combinação de filtros pedida."""
+    recorte = cubo[cubo['dimensao'] == ','.join(dimensoes)]
+    for col, valores in filtros.items():
+        recorte = recorte[recorte[col].isin(valores)]
+    cols_valor = ['valor', 'valor_2'][:len(dimensoes)]
+    recorte = recorte.dropna(subset=cols_valor)
+
+    somas = [c for c in cubo.columns if c == 'qtd' or c.endswith(('_n', '_sum', '_sq'))]
+    if dimensoes:
+        grupos = recorte.groupby(cols_valor)[somas].sum().reset_index()
+        grupos = grupos.rename(columns=dict(zip(cols_valor, dimensoes)))
+    else:
+        grupos = recorte[somas].sum().to_frame().T
+
+    resultado = pd.DataFrame({d: grupos[d] for d in dimensoes})
+    for alias, (col, func) in metricas.items():
+        if col == 'row_id':
+            resultado[alias] = grupos['qtd']
+        elif func == 'sum':
+            resultado[alias] = grupos[f'{col}_sum']
+        elif func == 'count':
+            resultado[alias] = grupos[f'{col}_n']
+        else:
+            resultado[alias] = grupos[f'{col}_sum'] / grupos[f'{col}_n']
+    return ordenar_dimensoes(resultado, dimensoes)
+
+def ordenar_dimensoes(df, dimensoes):
+    """Devolve as dimensões com o mesmo tipo/ordem que o groupby do pandas produziria."""
+    if 'upload_hour' in dimensoes:
+        df['upload_hour'] = pd.to_numeric(df['upload_hour'])
+    if 'duration_bin' in dimensoes:
+        df['duration_bin'] = pd.Categorical(df['duration_bin'], categories=DURATION_LABELS, ordered=True)
+    return df.sort_values(list(dimensoes)).reset_index(drop=True) if dimensoes else df.reset_index(drop=True)
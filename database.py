@@ -1,8 +1,45 @@
 # database.py
+import itertools
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+import numpy as np
 import pandas as pd
-from sqlalchemy import create_engine, text
-from urllib.parse import quote_plus
+from pandas.api.types import union_categoricals
+from sqlalchemy import text, bindparam
 import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from config import SNAPSHOT_DIR, SNAPSHOT_TTL, SCHEMA_CATEGORIAS, SCHEMA_INTEIROS, TAMANHO_LOTE_CARGA, TAMANHO_LOTE_TEXTO, LIMITE_LEITURA_COMPLETA, TAMANHO_CACHE_TITULOS
+from conexao import obter_engine
+from sql_estrela import JOINS_ESTRELA
+from cubo import TABELA_CUBO
+
+QUERY_FATO_BASE = f"""
+SELECT 
+    v.video_id, v.row_id, v.publish_date_approx, v.views, v.likes, 
+    v.comments, v.shares, v.engagement_rate, v.engagement_total, 
+    v.duration_sec, v.upload_hour, v.publish_dayofweek, v.has_emoji,
+    v.is_weekend, -- Campo adicionado para evitar KeyError no ML
+    c.country_code AS country, p.name AS platform, cat.name AS category, 
+    d.device_type, r.name AS region, t.year_month,
+    s.sound_id, s.music_track, s.is_global_hit, s.chart_rank
+{JOINS_ESTRELA}
+"""
+QUERY_FATO = QUERY_FATO_BASE + "WHERE v.video_id > :desde AND v.video_id <= :ate"
+# Linhas já no snapshot que o ETL incremental atualizou (mesmo video_id, conteúdo novo)
+QUERY_FATO_ALTERADOS = QUERY_FATO_BASE + """JOIN etl_row_hash h ON h.row_id = v.row_id
+WHERE h.atualizado_em > :desde AND v.video_id <= :ate"""
+
+# Textos pesados (title) ficam fora da fato carregada e são buscados sob demanda
+QUERY_TITULOS = "SELECT row_id, title FROM fact_video WHERE row_id IN :ids"
+
+# Incrementar quando as colunas de QUERY_FATO mudarem, para descartar snapshots antigos
+VERSAO_SNAPSHOT = 2
+SNAPSHOT_ARQUIVO = os.path.join(SNAPSHOT_DIR, "fact_video.parquet")
+SNAPSHOT_META = os.path.join(SNAPSHOT_DIR, "fact_video.meta.json")
+_lock_snapshot = threading.Lock()
 
 def get_db_connection():
     if "db_credentials" in st.secrets:
@@ -13,49 +50,259 @@ def get_db_connection():
         st.error("Credenciais não encontradas nos Secrets (.streamlit/secrets.toml).")
         st.stop()
 
-@st.cache_data(ttl=600)
-def carregar_dados_mysql() -> pd.DataFrame:
+def get_engine():
+    """Engine com pool compartilhada por todas as sessões do dashboard."""
+    return obter_engine(*get_db_connection())
+
+def ler_snapshot():
+    """Lê o snapshot local (Parquet) e seus metadados. Retorna (None, None) se não existir."""
+    if not (os.path.exists(SNAPSHOT_ARQUIVO) and os.path.exists(SNAPSHOT_META)):
+        return None, None
     try:
-        user, password, host, port, db = get_db_connection()
-        connection_string = f"mysql+pymysql://{user}:{quote_plus(password)}@{host}:{port}/{db}"
-        engine = create_engine(connection_string)
-        
-        query = """
-        SELECT 
-            v.row_id, v.title, v.publish_date_approx, v.views, v.likes, 
-            v.comments, v.shares, v.engagement_rate, v.engagement_total, 
-            v.duration_sec, v.upload_hour, v.publish_dayofweek, v.has_emoji,
-            v.is_weekend, -- Campo adicionado para evitar KeyError no ML
-            v.sample_comments,
-            c.country_code AS country, p.name AS platform, cat.name AS category, 
-            d.device_type, r.name AS region, t.year_month,
-            s.music_track, s.is_global_hit, s.chart_rank
-        FROM fact_video v
-        JOIN dim_country c ON v.country_id = c.country_id
-        JOIN dim_platform p ON v.platform_id = p.platform_id
-        JOIN dim_category cat ON v.category_id = cat.category_id
-        JOIN dim_device d ON v.device_id = d.device_id
-        JOIN dim_region r ON v.region_id = r.region_id
-        JOIN dim_time_bucket t ON v.time_bucket_id = t.time_bucket_id
-        JOIN dim_sound s ON v.sound_id = s.sound_id
-        """
-        with engine.connect() as conn:
-            df = pd.read_sql(text(query), conn)
-        
-        # Tratamento de datas e períodos
-        df['publish_date_approx'] = pd.to_datetime(df['publish_date_approx'])
-        df['year_month'] = df['publish_date_approx'].dt.to_period('M').astype(str)
-        return df
+        with open(SNAPSHOT_META, encoding="utf-8") as f:
+            meta = json.load(f)
+        df = pd.read_parquet(SNAPSHOT_ARQUIVO)
+        df.attrs['versao'] = meta["atualizado_em"]
+        return df, meta
+    except Exception:
+        return None, None
+
+def salvar_snapshot(df, meta):
+    """Grava o snapshot de forma atômica (arquivo temporário + rename)."""
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    tmp_dados, tmp_meta = SNAPSHOT_ARQUIVO + ".tmp", SNAPSHOT_META + ".tmp"
+    df.to_parquet(tmp_dados, index=False)
+    with open(tmp_meta, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(tmp_dados, SNAPSHOT_ARQUIVO)
+    os.replace(tmp_meta, SNAPSHOT_META)
+
+def snapshot_valido(meta):
+    return meta is not None and time.time() - meta.get("atualizado_em", 0) < SNAPSHOT_TTL
+
+def snapshot_compativel(meta):
+    return meta is not None and meta.get("versao_schema") == VERSAO_SNAPSHOT
+
+def tratar_datas(df):
+    # Tratamento de datas e períodos
+    df['publish_date_approx'] = pd.to_datetime(df['publish_date_approx'])
+    df['year_month'] = df['publish_date_approx'].dt.to_period('M').astype(str)
+    return df
+
+def menor_inteiro(serie):
+    """Converte para o menor inteiro que comporta os valores (Int8/Int16... se houver nulos)."""
+    serie = pd.to_numeric(serie)
+    validos = serie.dropna()
+    if not (validos % 1 == 0).all():
+        return serie
+    if len(validos) == len(serie):
+        return pd.to_numeric(serie, downcast='integer')
+    for bits in (8, 16, 32, 64):
+        info = np.iinfo(f"int{bits}")
+        if validos.empty or (validos.min() >= info.min and validos.max() <= info.max):
+            return serie.astype(f"Int{bits}")
+    return serie
+
+def converter_tipos(df):
+    """Aplica o schema de carga: categóricas + inteiros reduzidos."""
+    for col in SCHEMA_CATEGORIAS:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+    for col in SCHEMA_INTEIROS:
+        if col in df.columns:
+            df[col] = menor_inteiro(df[col])
+    return df
+
+def aplicar_schema(df, antes=None):
+    """Converte os tipos e reporta o ganho de memória (antes = bytes brutos, se já medidos por lote)."""
+    antes = df.memory_usage(deep=True).sum() if antes is None else antes
+    df = converter_tipos(df)
+    depois = df.memory_usage(deep=True).sum()
+    df.attrs['memoria_mb'] = (round(antes / 1024**2, 2), round(depois / 1024**2, 2))
+    print(f"💾 Fato carregada: {antes / 1024**2:.1f} MB -> {depois / 1024**2:.1f} MB ({antes / max(depois, 1):.1f}x menor)")
+    return df
+
+def concatenar_lotes(lotes):
+    """
+    Junta lotes já convertidos coluna a coluna, alocando cada coluna final uma única vez.
+    Categóricas são unidas com union_categoricals para não voltarem a ser object.
+    """
+    colunas = {}
+    for col in lotes[0].columns:
+        partes = [lote[col] for lote in lotes]
+        if all(isinstance(p.dtype, pd.CategoricalDtype) for p in partes):
+            colunas[col] = pd.Series(union_categoricals(partes, sort_categories=True), name=col)
+        else:
+            colunas[col] = pd.concat(partes, ignore_index=True)
+        for lote in lotes:
+            del lote[col]
+    return pd.DataFrame(colunas)
+
+def atualizar_sons(conn, df):
+    """Reaplica is_global_hit/chart_rank atuais, pois o scraper diário altera dim_sound sem mexer na fato."""
+    sons = pd.read_sql(text("SELECT sound_id, music_track, is_global_hit, chart_rank FROM dim_sound"), conn).set_index('sound_id')
+    df = df[df['sound_id'].isin(sons.index)].reset_index(drop=True)
+    for col in ['music_track', 'is_global_hit', 'chart_rank']:
+        df[col] = df['sound_id'].map(sons[col])
+    return df
+
+def ler_fato_em_lotes(conn, desde, ate, esperado, progresso=None, consulta=QUERY_FATO):
+    """
+    Lê a fato com cursor do lado do servidor (stream_results) em lotes de TAMANHO_LOTE_CARGA,
+    convertendo datas e tipos a cada lote. Retorna os lotes e o tamanho bruto (bytes) lido.
+    """
+    conn = conn.execution_options(stream_results=True)
+    lotes, lidos, bytes_brutos = [], 0, 0
+    for lote in pd.read_sql(text(consulta), conn, params={"desde": desde, "ate": ate}, chunksize=TAMANHO_LOTE_CARGA):
+        if lote.empty:
+            # Consulta sem linhas ainda devolve um lote vazio, com categóricas sem tipo definido
+            continue
+        bytes_brutos += lote.memory_usage(deep=True).sum()
+        lotes.append(converter_tipos(tratar_datas(lote)))
+        lidos += len(lote)
+        if progresso:
+            progresso(min(lidos / max(esperado, 1), 1.0), f"Carregando vídeos... {lidos:,}/{esperado:,}".replace(",", "."))
+    return lotes, bytes_brutos
+
+def carimbo_hashes(conn):
+    """Último carimbo gravado pelo ETL em etl_row_hash (None se a tabela ainda não existe)."""
+    try:
+        carimbo = conn.execute(text("SELECT MAX(atualizado_em) FROM etl_row_hash")).scalar()
+    except Exception:
+        conn.rollback()
+        return None
+    return None if carimbo is None else str(carimbo)
+
+def sincronizar_snapshot(engine, df, meta, progresso=None):
+    """
+    Atualiza o snapshot buscando apenas vídeos acima do high-water mark (video_id)
+    e, abaixo dele, as linhas que o ETL incremental alterou desde a última sincronização.
+    Se a fato foi recarregada (TRUNCATE) ou teve linhas removidas, refaz a carga completa.
+    """
+    hwm = meta["hwm"] if df is not None else 0
+    with engine.connect() as conn:
+        max_id, total, ate_hwm = conn.execute(
+            text("SELECT COALESCE(MAX(video_id), 0), COUNT(*), COALESCE(SUM(video_id <= :hwm), 0) FROM fact_video"),
+            {"hwm": hwm}
+        ).one()
+
+        if df is None or max_id < hwm or int(ate_hwm) != meta["linhas_ate_hwm"]:
+            df, hwm, ate_hwm = None, 0, 0
+
+        carimbo = carimbo_hashes(conn)
+        lotes, bytes_brutos = ler_fato_em_lotes(conn, hwm, max_id, int(total) - int(ate_hwm), progresso)
+        if df is not None and carimbo is not None and carimbo != meta.get("carimbo_hashes"):
+            alterados, bytes_alterados = ler_fato_em_lotes(
+                conn, meta.get("carimbo_hashes") or "1970-01-01", hwm, 0, consulta=QUERY_FATO_ALTERADOS
+            )
+            if alterados:
+                ids = pd.concat([lote['video_id'] for lote in alterados])
+                df = df[~df['video_id'].isin(ids)]
+                lotes = alterados + lotes
+                bytes_brutos += bytes_alterados
+        if df is not None:
+            bytes_brutos += df.memory_usage(deep=True).sum()
+            # Cópia rasa: concatenar_lotes descarta colunas dos lotes à medida que avança
+            lotes.insert(0, df.copy(deep=False))
+        if lotes:
+            df = concatenar_lotes(lotes)
+        else:
+            # Fato vazia: a consulta não devolveu nenhum lote
+            df = converter_tipos(tratar_datas(pd.read_sql(text(QUERY_FATO), conn, params={"desde": 0, "ate": 0})))
+        df = aplicar_schema(atualizar_sons(conn, df), antes=bytes_brutos)
+
+    meta = {"hwm": int(max_id), "linhas_ate_hwm": int(total), "carimbo_hashes": carimbo,
+            "atualizado_em": time.time(), "versao_schema": VERSAO_SNAPSHOT}
+    # Identifica a versão dos dados para os caches derivados (índice de filtros etc.)
+    df.attrs['versao'] = meta["atualizado_em"]
+    return df, meta
+
+@st.cache_data(ttl=600, show_spinner=False)
+def carregar_dados_mysql(_progresso=None) -> pd.DataFrame:
+    """_progresso: callback opcional (fração, texto), p.ex. st.progress(...).progress."""
+    with _lock_snapshot:
+        df, meta = ler_snapshot()
+        if not snapshot_compativel(meta):
+            df, meta = None, None
+        if df is not None and snapshot_valido(meta):
+            return df
+        try:
+            df, meta = sincronizar_snapshot(get_engine(), df, meta, _progresso)
+            salvar_snapshot(df, meta)
+            return df
+        except Exception as e:
+            if df is not None:
+                st.warning(f"MySQL indisponível, usando snapshot local: {e}")
+                return df
+            st.error(f"Erro ao carregar dados do MySQL: {e}")
+            return pd.DataFrame()
+
+class CacheTextos:
+    """
+    Títulos por row_id, buscados só para as linhas pedidas e guardados entre reruns e sessões.
+    Pedidos grandes viram uma única leitura em streaming da coluna inteira.
+    Guarda no máximo `tamanho` títulos; os mais antigos saem primeiro. Um pedido maior que o cache
+    não é guardado: só tiraria os títulos que os próximos reruns usam.
+    """
+    def __init__(self, tamanho=TAMANHO_CACHE_TITULOS):
+        self.tamanho = tamanho
+        self.titulos = {}
+        self.lock = threading.Lock()
+
+    def buscar(self, conn, faltando):
+        """Títulos (row_id -> title) dos row_ids pedidos; row_ids sem título no banco ficam com None."""
+        encontrados = dict.fromkeys(faltando)
+        if len(faltando) > LIMITE_LEITURA_COMPLETA:
+            conn = conn.execution_options(stream_results=True)
+            lotes = pd.read_sql(text("SELECT row_id, title FROM fact_video"), conn, chunksize=TAMANHO_LOTE_CARGA)
+        else:
+            consulta = text(QUERY_TITULOS).bindparams(bindparam("ids", expanding=True))
+            lotes = (pd.read_sql(consulta, conn, params={"ids": faltando[i:i + TAMANHO_LOTE_TEXTO]})
+                     for i in range(0, len(faltando), TAMANHO_LOTE_TEXTO))
+        for lote in lotes:
+            # Na leitura completa só os pedidos ficam (o cache não vira a coluna inteira)
+            lote = lote[lote['row_id'].isin(encontrados)]
+            encontrados.update(zip(lote['row_id'], lote['title']))
+        return encontrados
+
+    def obter(self, engine, row_ids):
+        with self.lock:
+            titulos = {i: self.titulos[i] for i in pd.unique(row_ids) if i in self.titulos}
+        faltando = [i for i in pd.unique(row_ids) if i not in titulos]
+        if faltando:
+            with engine.connect() as conn:
+                novos = self.buscar(conn, faltando)
+            titulos.update(novos)
+            if len(novos) > self.tamanho:
+                return row_ids.map(titulos)
+            with self.lock:
+                self.titulos.update(novos)
+                excesso = len(self.titulos) - self.tamanho
+                for i in list(itertools.islice(self.titulos, max(excesso, 0))):
+                    del self.titulos[i]
+        return row_ids.map(titulos)
+
+@st.cache_resource(max_entries=1, show_spinner=False)
+def cache_textos(versao):
+    """Um cache por versão dos dados: o ETL atualiza títulos no lugar, então uma carga nova começa vazia."""
+    return CacheTextos()
+
+def buscar_titulos(row_ids, versao=None):
+    """Títulos das linhas pedidas, alinhados ao índice de row_ids. versao: df.attrs['versao'] do snapshot."""
+    return cache_textos(versao).obter(get_engine(), row_ids)
+
+def obter_titulos(row_ids, versao=None):
+    """Como buscar_titulos, mas uma falha vira aviso na tela e títulos vazios (None)."""
+    try:
+        return buscar_titulos(row_ids, versao)
     except Exception as e:
-        st.error(f"Erro ao carregar dados do MySQL: {e}")
-        return pd.DataFrame()
+        st.error(f"Erro ao carregar títulos: {e}")
+        return pd.Series(None, index=row_ids.index, dtype=object)
 
 @st.cache_data(ttl=600)
 def carregar_google_trends():
     try:
-        user, password, host, port, db = get_db_connection()
-        connection_string = f"mysql+pymysql://{user}:{quote_plus(password)}@{host}:{port}/{db}"
-        engine = create_engine(connection_string)
+        engine = get_engine()
         
         query = "SELECT * FROM fact_google_trends ORDER BY search_date"
         with engine.connect() as conn:
@@ -66,3 +313,41 @@ def carregar_google_trends():
         return df
     except Exception as e:
         return pd.DataFrame()
+
+@st.cache_data(ttl=600)
+def ler_cubo():
+    """Lê o cubo pré-agregado gerado pelo ETL (poucos milhares de linhas). Erros não entram no cache."""
+    with get_engine().connect() as conn:
+        return pd.read_sql(text(f"SELECT * FROM {TABELA_CUBO}"), conn)
+
+def carregar_cubo():
+    """Cubo do cache; se a leitura falhar, devolve vazio (agregar cai para o SQL) e tenta de novo na próxima."""
+    try:
+        return ler_cubo()
+    except Exception:
+        return pd.DataFrame()
+
+def carregar_dados_iniciais(progresso=None):
+    """
+    Busca a fato e o Google Trends ao mesmo tempo (cada um com sua conexão do pool).
+    O progresso dos dois é consolidado num único callback (fração, texto), chamado só pelo thread principal.
+    """
+    estado = {'fato': (0.0, "Carregando vídeos...")}
+    ctx = get_script_run_ctx()
+
+    def executar(funcao, **kwargs):
+        # Sem o contexto do script, st.cache_data/st.error não funcionam fora do thread principal
+        add_script_run_ctx(threading.current_thread(), ctx)
+        return funcao(**kwargs)
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        fut_fato = pool.submit(executar, carregar_dados_mysql, _progresso=lambda f, t: estado.update(fato=(f, t)))
+        fut_trends = pool.submit(executar, carregar_google_trends)
+        pendentes = {fut_fato, fut_trends}
+        while pendentes:
+            _, pendentes = wait(pendentes, timeout=0.1)
+            if progresso:
+                fracao, texto = estado['fato']
+                texto_trends = "Google Trends ✓" if fut_trends.done() else "Google Trends..."
+                progresso(0.9 * (1.0 if fut_fato.done() else fracao) + 0.1 * fut_trends.done(), f"{texto} • {texto_trends}")
+    return fut_fato.result(), fut_trends.result()
@@ -0,0 +1,53 @@
+# filtros.py
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+class IndiceFiltro:
+    """
+    Índice de bitsets para os filtros da barra lateral, montado uma vez por carga de dados.
+    Cada valor de cada dimensão guarda as linhas em que aparece (np.packbits, 1 bit por linha).
+    """
+    def __init__(self, df, dimensoes):
+        self.n = len(df)
+        self.bitsets = {}
+        for dim in dimensoes:
+            self.adicionar_dimensao(df, dim)
+
+    def adicionar_dimensao(self, df, dim):
+        cat = pd.Categorical(df[dim])
+        codigos = cat.codes
+        # Categorias sem nenhuma linha (coluna categórica do snapshot) ficam de fora, como no unique()
+        presentes = np.bincount(codigos[codigos >= 0], minlength=len(cat.categories)) > 0
+        self.bitsets[dim] = {valor: np.packbits(codigos == i) for i, valor in enumerate(cat.categories) if presentes[i]}
+
+    def valores(self, dim):
+        return sorted(self.bitsets[dim])
+
+    def mascara(self, selecao):
+        """
+        selecao: {dimensão: [valores]}. Combina com OU dentro da dimensão e E entre dimensões.
+        Dimensões com todos os valores selecionados não custam nada. Retorna um array booleano.
+        """
+        resultado = None
+        for dim, valores in selecao.items():
+            bits = self.bitsets[dim]
+            valores = set(valores)
+            if valores >= set(bits):
+                continue
+            acumulado = np.zeros((self.n + 7) // 8, dtype=np.uint8)
+            for valor in valores & set(bits):
+                np.bitwise_or(acumulado, bits[valor], out=acumulado)
+            resultado = acumulado if resultado is None else np.bitwise_and(resultado, acumulado, out=resultado)
+        if resultado is None:
+            return np.ones(self.n, dtype=bool)
+        return np.unpackbits(resultado, count=self.n).view(bool)
+
+    def posicoes(self, selecao):
+        """Mesma seleção, como array de posições (para df.iloc / np.take)."""
+        return np.flatnonzero(self.mascara(selecao))
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+def construir_indice(versao, _df, dimensoes):
+    """Um índice por versão dos dados; o DataFrame não entra no hash do cache."""
+    return IndiceFiltro(_df, dimensoes)
@@ -0,0 +1,72 @@
+# historico_chart.py
+# Histórico diário do chart global (append-only): gravado pelo scraper de música, consultado pelo dashboard
+from sqlalchemy import text
+
+TABELA_HISTORICO = 'fact_chart_history'
+TABELA_SONS = 'fact_chart_sound_history'
+
+def _sqlite(conn):
+    return conn.dialect.name == 'sqlite'
+
+def _criar_tabela(conn, tabela, colunas, indice):
+    """CREATE TABLE IF NOT EXISTS com um índice secundário (o SQLite não aceita INDEX inline)."""
+    if _sqlite(conn):
+        conn.execute(text(f"CREATE TABLE IF NOT EXISTS {tabela} ({colunas})"))
+        nome, cols = indice.split(' ', 1)
+        conn.execute(text(f"CREATE INDEX IF NOT EXISTS {nome} ON {tabela} {cols}"))
+    else:
+        conn.execute(text(f"CREATE TABLE IF NOT EXISTS {tabela} ({colunas}, INDEX {indice})"))
+
+def criar_tabelas_historico(engine):
+    """
+    Cria as duas tabelas do histórico numa transação própria, antes da sincronização: no MySQL o DDL
+    faz commit implícito e quebraria a atomicidade se rodasse junto com os UPDATEs.
+
+    - fact_chart_history: uma linha por (dia, posição). A chave primária (chart_date, chart_rank) é o índice
+      por dia e impede duplicar o chart se o scraper rodar duas vezes no mesmo dia.
+    - fact_chart_sound_history: uma linha por (dia, som que casou com um hit), o vínculo som -> hit calculado
+      pelo atualizar_dw, que depende do chart do dia e não sai só do nome. O índice serve a busca por som.
+    """
+    with engine.begin() as conn:
+        _criar_tabela(conn, TABELA_HISTORICO, """
+            chart_date DATE NOT NULL,
+            chart_rank INT NOT NULL,
+            track_key VARCHAR(255) NOT NULL,
+            PRIMARY KEY (chart_date, chart_rank)
+        """, "idx_track_data (track_key, chart_date)")
+        _criar_tabela(conn, TABELA_SONS, """
+            chart_date DATE NOT NULL,
+            sound_id BIGINT NOT NULL,
+            chart_rank INT NOT NULL,
+            PRIMARY KEY (chart_date, sound_id)
+        """, "idx_som_data (sound_id, chart_date)")
+
+def _inserir(conn, sql, linhas):
+    """INSERT IGNORE em massa na transação do chamador; linhas já gravadas para a data são mantidas."""
+    if not linhas:
+        return 0
+    ignore = "INSERT OR IGNORE" if _sqlite(conn) else "INSERT IGNORE"
+    return conn.execute(text(f"{ignore} {sql}"), linhas).rowcount
+
+def gravar_chart_do_dia(conn, hits, data):
+    """Grava o chart do dia num único INSERT em massa, na mesma transação do vínculo som -> hit."""
+    linhas = [{"data": data, "rank": hit["rank"], "track": hit["musica_limpa"][:255]} for hit in hits]
+    return _inserir(conn, f"INTO {TABELA_HISTORICO} (chart_date, chart_rank, track_key) VALUES (:data, :rank, :track)", linhas)
+
+def gravar_sons_do_dia(conn, sons_rank, data):
+    """Grava os pares (sound_id, rank) do dia na transação do chamador."""
+    linhas = [{"data": data, "som": int(som), "rank": int(rank)} for som, rank in sons_rank]
+    return _inserir(conn, f"INTO {TABELA_SONS} (chart_date, sound_id, chart_rank) VALUES (:data, :som, :rank)", linhas)
+
+def rank_do_som_em(conn, sound_id, data):
+    """
+    Rank do som no chart vigente em `data`, isto é, o último coletado até essa data; None se ele não casou
+    com nenhum hit naquele chart. O chart e os vínculos do dia são gravados na mesma transação, então o dia
+    escolhido pelo MAX (da chave primária do histórico) sempre tem os vínculos completos; o rank sai do
+    índice (sound_id, chart_date), sem varrer o histórico.
+    """
+    return conn.execute(text(f"""
+        SELECT chart_rank FROM {TABELA_SONS}
+        WHERE sound_id = :som
+          AND chart_date = (SELECT MAX(chart_date) FROM {TABELA_HISTORICO} WHERE chart_date <= :data)
+    """), {"som": sound_id, "data": data}).scalar()
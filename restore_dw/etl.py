@@ -1,9 +1,27 @@
+import argparse
+import codecs
+import functools
+import json
+import threading
+import tracemalloc
+try:
+    import resource
+except ImportError:  # Windows: sem getrusage, o pico por RSS fica vazio
+    resource = None
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from contextlib import contextmanager
 import pandas as pd
 import numpy as np
-from sqlalchemy import create_engine, text
-from urllib.parse import quote_plus
+from sqlalchemy import text, bindparam, create_engine
 import sys
 import os
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from conexao import obter_engine
+from cubo import construir_cubo
 
 
 # 1. CONFIGURAÇÕES
@@ -14,6 +32,12 @@ DB_HOST = 'localhost'
 DB_PORT = '3306'
 DB_NAME = 'tiktok_analytics'
 CSV_NAME = "youtube_shorts_tiktok_trends_2025.csv"
+TAMANHO_LOTE_DIM = 1000  # linhas por INSERT multi-linha na carga das dimensões
+PARALELISMO_CARGA = 4    # threads (e conexões do pool) para dimensões e partições da fato
+TAMANHO_CHUNK_CSV = 100000  # linhas do CSV processadas por vez (limita o pico de memória)
+LOG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "logs")  # JSON de cada execução
+# Alvo alternativo (p.ex. sqlite:///bench.db ou um MariaDB local), usado pelo harness de benchmark
+DB_URL = os.getenv('ETL_DB_URL')
 
 base_dir = os.path.dirname(os.path.abspath(__file__))
 file_path = os.path.join(base_dir, CSV_NAME)
@@ -21,16 +45,140 @@ if not os.path.exists(file_path):
     parent_dir = os.path.dirname(base_dir)
     file_path = os.path.join(parent_dir, CSV_NAME)
 
+@functools.lru_cache(maxsize=None)
+def criar_engine_alvo(local_infile=False):
+    if not DB_URL:
+        return obter_engine(DB_USER, DB_PASS, DB_HOST, DB_PORT, DB_NAME, local_infile=local_infile)
+    if DB_URL.startswith('sqlite'):
+        # Threads das dimensões/partições esperam o lock de escrita do SQLite em vez de falhar
+        return create_engine(DB_URL, connect_args={'timeout': 120})
+    return create_engine(DB_URL, connect_args={'local_infile': True} if local_infile else {})
+
 try:
-    connection_string = f"mysql+pymysql://{DB_USER}:{quote_plus(DB_PASS)}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
-    engine = create_engine(connection_string)
+    engine = criar_engine_alvo()
 except Exception as e:
     print(f"❌ Erro de conexão: {e}")
     sys.exit(1)
+SQLITE = engine.dialect.name == 'sqlite'
+INSERT_IGNORE = "INSERT OR IGNORE" if SQLITE else "INSERT IGNORE"
 
 
 # 2. FUNÇÕES ÚTEIS
 
+# Métricas por etapa da execução atual (acumuladas entre os chunks do CSV)
+METRICAS = {}
+_lock_metricas = threading.Lock()
+
+def pico_rss_mb():
+    """Pico de RSS do processo até agora (getrusage: custo desprezível, ao contrário do tracemalloc)."""
+    if resource is None:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return pico / 1024**2 if sys.platform == 'darwin' else pico / 1024  # bytes no macOS, KB no Linux
+
+@contextmanager
+def etapa(nome, entrada=0):
+    """
+    Instrumenta uma etapa: tempo, linhas de entrada/saída, rejeitadas, pico de memória e erros.
+    Quem usa ajusta o registro devolvido ('saida', 'rejeitadas'); por padrão saída = entrada - rejeitadas.
+    Pico de memória: por padrão o pico de RSS do processo ao fim da etapa (monotônico, então a etapa
+    que o faz subir é a que alocou). Com --memoria, o pico de alocações Python da própria etapa
+    (tracemalloc), medido só no thread principal: nas etapas em threads ele é global e fica com a etapa-mãe.
+    """
+    with _lock_metricas:
+        # setdefault fixa a ordem: a etapa aparece antes das subetapas
+        m = METRICAS.setdefault(nome, {'tempo_s': 0.0, 'linhas_entrada': 0, 'linhas_saida': 0,
+                                       'rejeitadas': 0, 'pico_memoria_mb': None, 'erros': []})
+    medir_memoria = threading.current_thread() is threading.main_thread()
+    usar_tracemalloc = medir_memoria and tracemalloc.is_tracing()
+    if usar_tracemalloc:
+        tracemalloc.reset_peak()
+    registro = {'saida': None, 'rejeitadas': 0, 'falhas': []}
+    inicio = time.perf_counter()
+    try:
+        yield registro
+    except Exception as e:
+        registro['falhas'].append(f"{type(e).__name__}: {e}")
+        raise
+    finally:
+        duracao = time.perf_counter() - inicio
+        with _lock_metricas:
+            m['tempo_s'] += duracao
+            m['linhas_entrada'] += entrada
+            rejeitadas = int(registro['rejeitadas'])
+            m['linhas_saida'] += entrada - rejeitadas if registro['saida'] is None else int(registro['saida'])
+            m['rejeitadas'] += rejeitadas
+            m['erros'].extend(registro['falhas'])
+            pico = None
+            if usar_tracemalloc:
+                pico = tracemalloc.get_traced_memory()[1] / 1024**2
+            elif medir_memoria:
+                pico = pico_rss_mb()
+            if pico is not None:
+                m['pico_memoria_mb'] = max(m['pico_memoria_mb'] or 0.0, round(pico, 1))
+
+def registrar_falha(registro, erro, linhas):
+    """Falha tolerada (a carga segue): vai para as métricas em vez de sumir num except: pass."""
+    print(f"⚠️ {type(erro).__name__}: {erro}")
+    registro['rejeitadas'] += linhas
+    registro['falhas'].append(f"{type(erro).__name__}: {erro}")
+
+def linhas_por_s(m):
+    linhas = m['linhas_entrada'] or m['linhas_saida']  # leitura do CSV: só há saída
+    return round(linhas / m['tempo_s'], 1) if m['tempo_s'] > 0 else None
+
+def resumo_etapas():
+    print("\n⏱️ Etapas:")
+    print(f"   {'etapa':<28} {'tempo':>8} {'entrada':>10} {'saída':>10} {'linhas/s':>11} {'rejeit.':>8} {'pico MB':>8}")
+    for nome, m in METRICAS.items():
+        pico = '-' if m['pico_memoria_mb'] is None else f"{m['pico_memoria_mb']:.1f}"
+        vel = linhas_por_s(m)
+        print(f"   {nome:<28} {m['tempo_s']:7.2f}s {m['linhas_entrada']:>10} {m['linhas_saida']:>10} "
+              f"{'-' if vel is None else f'{vel:,.0f}':>11} {m['rejeitadas']:>8} {pico:>8}"
+              + (f"  ⚠️ {len(m['erros'])} erro(s)" if m['erros'] else ""))
+
+def gravar_log_execucao(engine, execucao):
+    """Grava as métricas da execução em etl_run_log (uma linha por etapa) e num JSON em LOG_DIR."""
+    etapas = [{'etapa': nome.strip(), **m, 'linhas_por_s': linhas_por_s(m)} for nome, m in METRICAS.items()]
+    os.makedirs(LOG_DIR, exist_ok=True)
+    caminho = os.path.join(LOG_DIR, f"etl_run_{execucao['run_id']}.json")
+    with open(caminho, "w", encoding="utf-8") as f:
+        json.dump({**execucao, 'etapas': etapas}, f, ensure_ascii=False, indent=2, default=str)
+
+    try:
+        with engine.begin() as conn:
+            conn.execute(text(f"""
+                CREATE TABLE IF NOT EXISTS etl_run_log (
+                    id {'INTEGER PRIMARY KEY AUTOINCREMENT' if SQLITE else 'INT AUTO_INCREMENT PRIMARY KEY'},
+                    run_id VARCHAR(32) NOT NULL,
+                    iniciado_em DATETIME NOT NULL,
+                    modo VARCHAR(16),
+                    status VARCHAR(16),
+                    etapa VARCHAR(64) NOT NULL,
+                    tempo_s DOUBLE,
+                    linhas_entrada BIGINT,
+                    linhas_saida BIGINT,
+                    linhas_por_s DOUBLE,
+                    rejeitadas BIGINT,
+                    pico_memoria_mb DOUBLE,
+                    erros TEXT
+                )
+            """))
+            for indice in ["idx_run (run_id)", "idx_etapa (etapa, iniciado_em)"]:
+                criar_indice(conn, 'etl_run_log', indice)
+            if etapas:
+                conn.execute(text("""
+                    INSERT INTO etl_run_log (run_id, iniciado_em, modo, status, etapa, tempo_s, linhas_entrada, linhas_saida,
+                                             linhas_por_s, rejeitadas, pico_memoria_mb, erros)
+                    VALUES (:run_id, :iniciado_em, :modo, :status, :etapa, :tempo_s, :linhas_entrada, :linhas_saida,
+                            :linhas_por_s, :rejeitadas, :pico_memoria_mb, :erros)
+                """), [{'run_id': execucao['run_id'], 'iniciado_em': execucao['iniciado_em'], 'modo': execucao['modo'],
+                        'status': execucao['status'], **e, 'erros': "\n".join(e['erros']) or None} for e in etapas])
+    except Exception as e:
+        print(f"⚠️ Não foi possível gravar etl_run_log ({e}); métricas salvas em {caminho}")
+        return
+    print(f"📝 Métricas da execução {execucao['run_id']} em etl_run_log e {caminho}")
+
 def corrigir_data_invertida(val):
     """
     Tenta corrigir datas. Se o mês for > 8 (Setembro em diante),
@@ -57,183 +205,641 @@ def corrigir_data_invertida(val):
     except:
         return pd.NaT
 
+def corrigir_datas(serie):
+    """
+    Versão vetorizada de corrigir_data_invertida, com as mesmas regras e o mesmo resultado.
+    As regras dependem só do texto, então são aplicadas uma vez por valor distinto
+    e o resultado volta para as linhas pelos códigos do factorize.
+    Retorna a série de datas e um relatório com as contagens de linhas por regra.
+    """
+    codigos, unicos = pd.factorize(serie, use_na_sentinel=False)
+    unicos = pd.Series(unicos, dtype=object)
+    linhas_por_unico = np.bincount(codigos, minlength=len(unicos))
+
+    # 1. Formato exótico YYYY-DD-MM (vetorizado)
+    ydm = pd.to_datetime(unicos, format='%Y-%d-%m', errors='coerce')
+    via_ydm = ydm.notna().to_numpy()
+
+    # 2. Formato padrão, inferido valor a valor como no apply (o parse em lote fixaria um único formato)
+    padrao = [pd.to_datetime(v, errors='coerce') for v in unicos[~via_ydm]]
+    if not any(getattr(d, 'tzinfo', None) for d in padrao):
+        datas = ydm.copy()
+        datas[~via_ydm] = pd.to_datetime(pd.Series(padrao, dtype=object), errors='coerce').to_numpy()
+        via_padrao = ~via_ydm & datas.notna().to_numpy()
+
+        # 3. Mês > 8: troca dia/mês quando a troca gera data válida (dia <= 12), senão mantém
+        inverter = ((datas.dt.month > 8) & (datas.dt.day <= 12)).to_numpy()
+        if inverter.any():
+            d = datas[inverter]
+            trocadas = pd.to_datetime(pd.DataFrame({'year': d.dt.year, 'month': d.dt.day, 'day': d.dt.month}))
+            datas[inverter] = trocadas + (d - d.dt.normalize())
+    else:
+        # Datas com fuso horário não cabem em datetime64: mantém a regra escalar
+        base = pd.Series(list(ydm.astype(object).where(via_ydm, None)), dtype=object)
+        base[~via_ydm] = padrao
+        datas = unicos.map(corrigir_data_invertida)
+        via_padrao = ~via_ydm & base.notna().to_numpy()
+        inverter = (base.notna() & (datas != base)).to_numpy()
+
+    resultado = pd.Series(datas.to_numpy()[codigos], index=serie.index, name=serie.name)
+    relatorio = {
+        'formato_ydm': int(linhas_por_unico[via_ydm].sum()),
+        'formato_padrao': int(linhas_por_unico[via_padrao].sum()),
+        'invertidas_corrigidas': int(linhas_por_unico[inverter].sum()),
+        'descartadas': int(linhas_por_unico[datas.isna().to_numpy()].sum()),
+    }
+    return resultado, relatorio
+
 def limpar_banco(engine):
     print("\n🧹 Esvaziando tabelas (TRUNCATE)...")
     tabelas = [
         'bridge_video_hashtag', 'bridge_video_tag', 'fact_video',
         'dim_country', 'dim_platform', 'dim_language', 'dim_category',
         'dim_traffic_source', 'dim_creator', 'dim_sound', 'dim_device',
-        'dim_time_bucket', 'dim_hashtag', 'dim_tag', 'dim_region'
+        'dim_time_bucket', 'dim_hashtag', 'dim_tag', 'dim_region', 'etl_row_hash'
     ]
+    # SQLite não tem TRUNCATE: DELETE sem WHERE equivale (e zera o AUTOINCREMENT via sqlite_sequence)
+    fk_off, fk_on = ("PRAGMA foreign_keys = OFF;", "PRAGMA foreign_keys = ON;") if SQLITE else ("SET FOREIGN_KEY_CHECKS = 0;", "SET FOREIGN_KEY_CHECKS = 1;")
     with engine.begin() as conn:
-        conn.execute(text("SET FOREIGN_KEY_CHECKS = 0;"))
+        conn.execute(text(fk_off))
         for t in tabelas:
-            try: conn.execute(text(f"TRUNCATE TABLE {t};"))
-            except: pass
-        conn.execute(text("SET FOREIGN_KEY_CHECKS = 1;"))
+            try: conn.execute(text(f"DELETE FROM {t};" if SQLITE else f"TRUNCATE TABLE {t};"))
+            except Exception as e: print(f"⚠️ TRUNCATE {t}: {e}")
+        if SQLITE:
+            try: conn.execute(text("DELETE FROM sqlite_sequence;"))
+            except Exception: pass  # só existe se alguma tabela usar AUTOINCREMENT
+        conn.execute(text(fk_on))
     print("Banco limpo.")
 
+# Lookups (id + chave) já carregados por dimensão, mantidos entre os chunks do CSV
+CHAVES = {}
+
+def carregar_dimensao(unicos, table_name, unique_cols, id_col, engine, tamanho_lote=TAMANHO_LOTE_DIM):
+    """
+    Carga em lote de uma dimensão: os valores distintos vão em lotes de tamanho_lote
+    (o executemany do PyMySQL envia cada lote como um único INSERT IGNORE ... VALUES (...),(...))
+    e as chaves substitutas voltam numa única consulta.
+    Nos chunks seguintes só os valores ainda fora de CHAVES vão ao banco; em chave simples,
+    só as chaves deles são lidas de volta.
+    """
+    conhecido = CHAVES.get(table_name)
+    if conhecido is not None:
+        visto = unicos[unique_cols].merge(conhecido[unique_cols].drop_duplicates(), on=unique_cols, how='left', indicator=True)['_merge'] == 'both'
+        unicos = unicos[~visto.to_numpy()]
+        if unicos.empty:
+            return conhecido
+
+    cols_db = list(unicos.columns)
+    cols_str = ", ".join([f"`{c}`" for c in cols_db])
+    vals = ", ".join([f":{c}" for c in cols_db])
+    sql = text(f"{INSERT_IGNORE} INTO {table_name} ({cols_str}) VALUES ({vals})")
+    registros = unicos.astype(object).where(unicos.notna(), None).to_dict(orient='records')
+
+    inicio = time.perf_counter()
+    with engine.begin() as conn:
+        for i in range(0, len(registros), tamanho_lote):
+            conn.execute(sql, registros[i:i + tamanho_lote])
+    duracao = max(time.perf_counter() - inicio, 1e-9)
+    print(f" Dim: {table_name} | {len(registros)} linhas em lotes de {tamanho_lote} | {len(registros) / duracao:,.0f} linhas/s")
+
+    cols_sel = ", ".join([f"`{c}`" for c in unique_cols])
+    sql = f"SELECT {id_col}, {cols_sel} FROM {table_name}"
+    if conhecido is None or len(unique_cols) > 1:
+        lkp = pd.read_sql(sql, engine)
+    else:
+        consulta = text(f"{sql} WHERE `{unique_cols[0]}` IN :chaves").bindparams(bindparam('chaves', expanding=True))
+        valores = unicos[unique_cols[0]].tolist()
+        with engine.connect() as conn:
+            novos = [pd.read_sql(consulta, conn, params={'chaves': valores[i:i + tamanho_lote]})
+                     for i in range(0, len(valores), tamanho_lote)]
+        lkp = pd.concat([conhecido] + novos, ignore_index=True)
+    CHAVES[table_name] = lkp
+    return lkp
+
 def load_dimension(df_source, col_mapping, table_name, unique_cols, lookup_col_name, engine):
-    print(f" Dim: {table_name}")
     cols_csv, cols_db = list(col_mapping.keys()), list(col_mapping.values())
     unique_df = df_source[cols_csv].drop_duplicates().dropna(subset=cols_csv).copy()
     unique_df.columns = cols_db
-    
-    cols_str = ", ".join([f"`{c}`" for c in cols_db])
-    vals = ", ".join([f":{c}" for c in cols_db])
-    sql = text(f"INSERT IGNORE INTO {table_name} ({cols_str}) VALUES ({vals})")
-    
-    with engine.begin() as conn:
-        d = unique_df.to_dict(orient='records')
-        if d: conn.execute(sql, d)
             
-    cols_sel = ", ".join([f"`{c}`" for c in unique_cols]) 
     id_col = f"{table_name.replace('dim_', '')}_id"
     if table_name == 'dim_category': id_col = 'category_id'
     if table_name == 'dim_traffic_source': id_col = 'traffic_source_id'
     
-    lkp = pd.read_sql(f"SELECT {id_col}, {cols_sel} FROM {table_name}", engine)
+    lkp = carregar_dimensao(unique_df, table_name, unique_cols, id_col, engine)
     
     if len(unique_cols) > 1:
-        lkp['key'] = lkp[unique_cols].apply(lambda x: tuple(x), axis=1)
-        return dict(zip(lkp['key'], lkp[id_col]))
+        # Chave composta: devolve o lookup para o merge de resolver_chave_composta
+        return lkp
     return dict(zip(lkp[unique_cols[0]], lkp[id_col]))
 
-# 3. PIPELINE PRINCIPAL
-def main():
-    print("\n Iniciando Pipeline...")
-    limpar_banco(engine)
-    
-    try: df = pd.read_csv(file_path, encoding='utf-8')
-    except: df = pd.read_csv(file_path, encoding='latin1')
+def resolver_chave_composta(df, lkp, col_mapping, id_col):
+    """
+    Resolve a chave substituta de uma dimensão de chave composta com um merge (hash join)
+    em vez de um dict.get linha a linha. Mantém a semântica do dict: componente nulo só
+    casa com linha do lookup que tenha NULL na mesma posição (como a tupla com None),
+    o que não encontra chave vira nulo e, em chave repetida no lookup, vale a última.
+    """
+    cols_csv, cols_db = list(col_mapping.keys()), list(col_mapping.values())
+    lkp = lkp.drop_duplicates(subset=cols_db, keep='last')
+    lkp = lkp[cols_db + [id_col]].rename(columns=dict(zip(cols_db, cols_csv)))
+    ids = df[cols_csv].merge(lkp, on=cols_csv, how='left')[id_col]
+    return pd.Series(ids.to_numpy(), index=df.index)
 
-    print("📅 Tratando datas ")
-    df['publish_date_approx'] = df['publish_date_approx'].astype(str).str.strip().str.split(' ').str[0]
-    
-    df['publish_date_approx'] = df['publish_date_approx'].apply(corrigir_data_invertida)
-    
-    nulos = df['publish_date_approx'].isna().sum()
-    if nulos > 0:
-        print(f"⚠️ {nulos} linhas com datas irrecuperáveis removidas.")
-        df = df.dropna(subset=['publish_date_approx'])
+def criar_tabela_hash(engine):
+    """Hash de conteúdo por row_id da última carga, usado pelo modo incremental (e pelo dashboard)."""
+    with engine.begin() as conn:
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS etl_row_hash (
+                row_id VARCHAR(64) PRIMARY KEY,
+                row_hash BIGINT NOT NULL,
+                atualizado_em DATETIME(6) NOT NULL
+            )
+        """))
+        criar_indice(conn, 'etl_row_hash', "idx_atualizado_em (atualizado_em)")
 
-    data_max = df['publish_date_approx'].max()
-    print(f" Nova Data Máxima: {data_max}")
-    
-    df['publish_date_approx'] = df['publish_date_approx'].dt.date
-    df['year_month'] = pd.to_datetime(df['publish_date_approx']).dt.strftime('%Y-%m')
-    df = df.replace({np.nan: None})
+def criar_indice(conn, tabela, indice):
+    """Índice secundário fora do CREATE TABLE (o SQLite não aceita INDEX inline); ignora se já existir."""
+    nome = indice.split(' ')[0]
+    if SQLITE:
+        conn.execute(text(f"CREATE INDEX IF NOT EXISTS {nome} ON {tabela} {indice[len(nome):]}"))
+        return
+    existe = conn.execute(text(f"SHOW INDEX FROM {tabela} WHERE Key_name = :nome"), {'nome': nome}).first()
+    if not existe:
+        conn.execute(text(f"CREATE INDEX {nome} ON {tabela} {indice[len(nome):]}"))
 
-    # --- CARGA ---
-    
-    # 1. Region
-    region_map = load_dimension(df, {'region': 'name'}, 'dim_region', ['name'], 'name', engine)
-    df['region_id'] = df['region'].map(region_map)
-
-    # 2. Country
-    print("Dim: dim_country")
-    cp = df[['country', 'region_id']].dropna().drop_duplicates()
-    cp.columns = ['country_code', 'region_id']
-    cp['name'] = cp['country_code']
+def texto_normalizado(serie):
+    """Texto da coluna independente do dtype inferido (5 e 5.0 viram '5'), que varia entre chunks."""
+    if pd.api.types.is_float_dtype(serie):
+        inteiro = (serie.notna() & (serie % 1 == 0) & (serie.abs() < 2**53)).to_numpy()
+        texto = serie.astype(str).astype(object)
+        texto[inteiro] = serie[inteiro].astype('int64').astype(str)
+        return texto
+    return serie.astype(str).astype(object)
+
+def hash_linhas(df):
+    """Hash de conteúdo de cada linha do CSV (uint64 reinterpretado como BIGINT), estável entre chunks."""
+    normalizado = pd.DataFrame({c: texto_normalizado(df[c]) for c in df.columns})
+    return pd.util.hash_pandas_object(normalizado, index=False).to_numpy().view(np.int64)
+
+def ler_estado_atual(engine):
+    """row_id -> video_id da fato e row_id -> hash da última carga, lidos uma vez por execução."""
+    atuais = pd.read_sql("SELECT row_id, video_id FROM fact_video", engine)
+    atuais['row_id'] = atuais['row_id'].astype(str)
+    atuais = atuais.drop_duplicates('row_id', keep='last').set_index('row_id')
+    # Lidos à parte: num LEFT JOIN os nulos converteriam o hash de 64 bits para float
+    hashes = pd.read_sql("SELECT row_id, row_hash FROM etl_row_hash", engine)
+    hashes = pd.Series(hashes['row_hash'].to_numpy(), index=hashes['row_id'].astype(str))
+    return atuais, hashes
+
+def separar_incremental(df, atuais, hashes):
+    """
+    Compara o chunk com o que já está no banco, por row_id + hash de conteúdo.
+    Retorna só as linhas novas ou alteradas e o video_id das alteradas (indexado por row_id).
+    Linhas na fato sem hash registrado (carga anterior ao modo incremental) contam como alteradas;
+    linhas fora da fato com o mesmo hash registrado foram descartadas antes (data irrecuperável) e são puladas.
+    """
+    chave = df['row_id'].astype(str)
+    existe = chave.isin(atuais.index).to_numpy()
+    com_hash = chave.isin(hashes.index).to_numpy()
+    mesmo_hash = np.zeros(len(df), dtype=bool)
+    mesmo_hash[com_hash] = hashes.reindex(chave[com_hash]).to_numpy() == df['row_hash'].to_numpy()[com_hash]
+    alterada = existe & ~mesmo_hash
+    nova = ~existe & ~mesmo_hash
+
+    alteradas = atuais.loc[chave[alterada].unique(), 'video_id']
+    return df[nova | alterada].copy(), alteradas
+
+def atualizar_fato(engine, fact_df, tamanho_lote=TAMANHO_LOTE_DIM):
+    """UPDATE por row_id das linhas alteradas (o video_id e as referências a ele são preservados)."""
+    cols = [c for c in fact_df.columns if c != 'row_id']
+    sets = ", ".join([f"`{c}` = :{c}" for c in cols])
+    sql = text(f"UPDATE fact_video SET {sets} WHERE row_id = :row_id")
+    registros = fact_df.astype(object).where(fact_df.notna(), None).to_dict(orient='records')
     with engine.begin() as conn:
-        for _, r in cp.iterrows():
-            conn.execute(
-                text("INSERT IGNORE INTO dim_country (country_code, name, region_id) VALUES (:c, :n, :r)"), 
-                {'c': r['country_code'], 'n': r['name'], 'r': r['region_id']}
-            )
-    c_lkp = pd.read_sql("SELECT country_code, country_id FROM dim_country", engine)
-    c_map = dict(zip(c_lkp['country_code'], c_lkp['country_id']))
-    df['country_id'] = df['country'].map(c_map)
-
-    p_map = load_dimension(df, {'platform': 'name'}, 'dim_platform', ['name'], 'name', engine)
-    df['platform_id'] = df['platform'].map(p_map)
-    l_map = load_dimension(df, {'language': 'language_code'}, 'dim_language', ['language_code'], 'language_code', engine)
-    df['language_id'] = df['language'].map(l_map)
-    cat_map = load_dimension(df, {'category': 'name'}, 'dim_category', ['name'], 'name', engine)
-    df['category_id'] = df['category'].map(cat_map)
-    t_map = load_dimension(df, {'traffic_source': 'name'}, 'dim_traffic_source', ['name'], 'name', engine)
-    df['traffic_source_id'] = df['traffic_source'].map(t_map)
-
-    # 4. Creator 
-    print("Dim: dim_creator")
-    cr_df = df[['author_handle', 'creator_avg_views', 'creator_tier']].dropna(subset=['author_handle']).drop_duplicates('author_handle')
+        for i in range(0, len(registros), tamanho_lote):
+            conn.execute(sql, registros[i:i + tamanho_lote])
+
+def limpar_bridges(engine, video_ids, tamanho_lote=TAMANHO_LOTE_DIM):
+    """Remove as bridges das linhas alteradas, que são regravadas com as hashtags/tags novas."""
+    ids = [int(v) for v in video_ids]
+    with engine.begin() as conn:
+        for t in ['bridge_video_hashtag', 'bridge_video_tag']:
+            sql = text(f"DELETE FROM {t} WHERE video_id IN :ids").bindparams(bindparam('ids', expanding=True))
+            for i in range(0, len(ids), tamanho_lote):
+                conn.execute(sql, {'ids': ids[i:i + tamanho_lote]})
+
+def registrar_hashes(engine, df, tamanho_lote=TAMANHO_LOTE_DIM):
+    """
+    Grava o hash das linhas carregadas numa única transação, todas com o mesmo carimbo do banco,
+    para que o dashboard veja a carga inteira ou nada ao buscar as linhas alteradas.
+    """
+    sql = text(f"""
+        INSERT INTO etl_row_hash (row_id, row_hash, atualizado_em) VALUES (:row_id, :row_hash, :carimbo)
+        {'ON CONFLICT(row_id) DO UPDATE SET row_hash = excluded.row_hash, atualizado_em = excluded.atualizado_em' if SQLITE
+         else 'ON DUPLICATE KEY UPDATE row_hash = VALUES(row_hash), atualizado_em = VALUES(atualizado_em)'}
+    """)
+    registros = pd.DataFrame({'row_id': df['row_id'].astype(str), 'row_hash': df['row_hash']}).astype(object).to_dict(orient='records')
     with engine.begin() as conn:
-        for _, r in cr_df.iterrows():
+        carimbo = conn.execute(text("SELECT strftime('%Y-%m-%d %H:%M:%f', 'now')" if SQLITE else "SELECT NOW(6)")).scalar()
+        for r in registros:
+            r['carimbo'] = carimbo
+        for i in range(0, len(registros), tamanho_lote):
+            conn.execute(sql, registros[i:i + tamanho_lote])
+
+def dim_simples(col_csv, col_db, table_name):
+    """Dimensão de um só atributo: o id sai de um map pelo valor do CSV."""
+    def carga(df, ids):
+        mapa = load_dimension(df, {col_csv: col_db}, table_name, [col_db], col_db, engine)
+        return df[col_csv].map(mapa)
+    return carga
+
+def dim_composta(col_mapping, table_name, id_col):
+    """Dimensão de chave composta: o id sai do merge de resolver_chave_composta."""
+    def carga(df, ids):
+        lkp = load_dimension(df, col_mapping, table_name, list(col_mapping.values()), 'x', engine)
+        return resolver_chave_composta(df, lkp, col_mapping, id_col)
+    return carga
+
+def carga_country(df, ids):
+    cp = pd.DataFrame({'country_code': df['country'], 'region_id': ids['region_id']}).dropna().drop_duplicates()
+    cp['name'] = cp['country_code']
+    c_lkp = carregar_dimensao(cp[['country_code', 'name', 'region_id']], 'dim_country', ['country_code'], 'country_id', engine)
+    return df['country'].map(dict(zip(c_lkp['country_code'], c_lkp['country_id'])))
+
+def carga_creator(df, ids):
+    cr_df = df[['author_handle', 'creator_avg_views', 'creator_tier']].dropna(subset=['author_handle']).drop_duplicates('author_handle')
+    cr_df.columns = ['handle', 'avg_views', 'tier']
+    cr_lkp = carregar_dimensao(cr_df, 'dim_creator', ['handle'], 'creator_id', engine)
+    return df['author_handle'].map(dict(zip(cr_lkp['handle'], cr_lkp['creator_id'])))
+
+# Coluna de id na fato -> (ids de que depende, carga). Só dim_country depende de outra (dim_region).
+DIMENSOES = {
+    'region_id': ([], dim_simples('region', 'name', 'dim_region')),
+    'country_id': (['region_id'], carga_country),
+    'platform_id': ([], dim_simples('platform', 'name', 'dim_platform')),
+    'language_id': ([], dim_simples('language', 'language_code', 'dim_language')),
+    'category_id': ([], dim_simples('category', 'name', 'dim_category')),
+    'traffic_source_id': ([], dim_simples('traffic_source', 'name', 'dim_traffic_source')),
+    'creator_id': ([], carga_creator),
+    'sound_id': ([], dim_composta({'sound_type': 'sound_type', 'music_track': 'music_track'}, 'dim_sound', 'sound_id')),
+    'device_id': ([], dim_composta({'device_type': 'device_type', 'device_brand': 'device_brand'}, 'dim_device', 'device_id')),
+    'time_bucket_id': ([], dim_composta({'year_month': 'year_month', 'season': 'season', 'event_season': 'event_season'}, 'dim_time_bucket', 'time_bucket_id')),
+}
+
+def carregar_dimensoes(df, max_workers=PARALELISMO_CARGA):
+    """
+    Carrega as dimensões num pool de threads (cada carga usa sua conexão do pool da engine),
+    disparando cada uma assim que as dependências terminam. Só lê o df; devolve os ids
+    por coluna para o thread principal atribuir.
+    """
+    def executar(col, carga, deps):
+        with etapa(f"  {col.replace('_id', '')}", len(df)) as r:
+            ids = carga(df, deps)
+            r['saida'] = ids.notna().sum()
+            return ids
+
+    ids, pendentes, futuros = {}, dict(DIMENSOES), {}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        while pendentes or futuros:
+            for col, (deps, carga) in list(pendentes.items()):
+                if all(d in ids for d in deps):
+                    futuros[pool.submit(executar, col, carga, {d: ids[d] for d in deps})] = col
+                    del pendentes[col]
+            feitos, _ = wait(futuros, return_when=FIRST_COMPLETED)
+            for f in feitos:
+                ids[futuros.pop(f)] = f.result()
+    return ids
+
+def coluna_tsv(serie):
+    """Coluna no formato do LOAD DATA (FIELDS ESCAPED BY '\\'): NULL = \\N; \\, tab e quebras escapados."""
+    nulo = serie.isna().to_numpy()
+    # Depois do replace({np.nan: None}) as numéricas viram object: volta ao dtype para não gravar '5.0' em INT
+    serie = serie.infer_objects()
+    if pd.api.types.is_bool_dtype(serie):
+        serie = serie.astype(int)
+    texto = texto_normalizado(serie)
+    if not (pd.api.types.is_numeric_dtype(serie) or pd.api.types.is_bool_dtype(serie)):
+        for original, escapado in [('\\', '\\\\'), ('\t', '\\t'), ('\n', '\\n'), ('\r', '\\r'), ('\0', '\\0')]:
+            texto = texto.str.replace(original, escapado, regex=False)
+    texto[nulo] = '\\N'
+    return texto
+
+def gravar_load_data(df, tabela, engine_infile):
+    """Grava o df num TSV temporário e carrega com LOAD DATA LOCAL INFILE (carga nativa do MySQL)."""
+    colunas = [coluna_tsv(df[c]) for c in df.columns]
+    linhas = colunas[0].str.cat(colunas[1:], sep='\t') if len(colunas) > 1 else colunas[0]
+    with tempfile.NamedTemporaryFile('w', suffix='.tsv', delete=False, encoding='utf-8', newline='') as f:
+        f.write('\n'.join(linhas))
+        f.write('\n')
+        caminho = f.name
+    try:
+        cols_str = ", ".join([f"`{c}`" for c in df.columns])
+        with engine_infile.begin() as conn:
             conn.execute(
-                text("INSERT IGNORE INTO dim_creator (handle, avg_views, tier) VALUES (:h, :a, :t)"),
-                {'h': r['author_handle'], 'a': r['creator_avg_views'], 't': r['creator_tier']}
+                text(f"""LOAD DATA LOCAL INFILE :arquivo INTO TABLE {tabela} CHARACTER SET utf8mb4
+                         FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\' LINES TERMINATED BY '\\n' ({cols_str})"""),
+                {'arquivo': caminho}
             )
-    cr_lkp = pd.read_sql("SELECT handle, creator_id FROM dim_creator", engine)
-    cr_map = dict(zip(cr_lkp['handle'], cr_lkp['creator_id']))
-    df['creator_id'] = df['author_handle'].map(cr_map)
+    finally:
+        os.remove(caminho)
 
-    snd_map = load_dimension(df, {'sound_type': 'sound_type', 'music_track': 'music_track'}, 'dim_sound', ['sound_type', 'music_track'], 'x', engine)
-    df['sound_id'] = df.apply(lambda x: snd_map.get((x['sound_type'], x['music_track'])), axis=1)
-    
-    dev_map = load_dimension(df, {'device_type': 'device_type', 'device_brand': 'device_brand'}, 'dim_device', ['device_type', 'device_brand'], 'x', engine)
-    df['device_id'] = df.apply(lambda x: dev_map.get((x['device_type'], x['device_brand'])), axis=1)
-    
-    time_map = load_dimension(df, {'year_month': 'year_month', 'season': 'season', 'event_season': 'event_season'}, 'dim_time_bucket', ['year_month', 'season', 'event_season'], 'x', engine)
-    df['time_bucket_id'] = df.apply(lambda x: time_map.get((x['year_month'], x['season'], x['event_season'])), axis=1)
+# Backend de carga em massa: 'to_sql' (padrão) ou 'load_data' (LOAD DATA LOCAL INFILE)
+CARGA = {'backend': 'to_sql', 'load_data_disponivel': True}
+# Recusas de LOAD DATA LOCAL: 1148 (comando não permitido), 3948 (local_infile=OFF no servidor),
+# 2068 (cliente sem local_infile). O LOAD nem começa, então voltar para to_sql não duplica linhas.
+ERROS_LOCAL_INFILE = {1148, 3948, 2068}
+
+def load_data_recusado(erro):
+    """True se o erro (do SQLAlchemy ou do driver) é o servidor/cliente recusando LOAD DATA LOCAL."""
+    args = getattr(getattr(erro, 'orig', erro), 'args', ())
+    return bool(args) and args[0] in ERROS_LOCAL_INFILE
+
+def gravar_tabela(df, tabela):
+    """
+    Inserção em massa de fact_video e das bridges pelo backend configurado em CARGA.
+    Se o servidor recusar LOAD DATA LOCAL (local_infile=OFF), avisa uma vez e volta para to_sql;
+    qualquer outro erro do LOAD (dados, conexão, restrições) sobe para quem chamou.
+    """
+    if df.empty:
+        return
+    if CARGA['backend'] == 'load_data' and CARGA['load_data_disponivel']:
+        try:
+            gravar_load_data(df, tabela, criar_engine_alvo(local_infile=True))
+            return
+        except Exception as e:
+            if not load_data_recusado(e):
+                raise
+            if CARGA['load_data_disponivel']:
+                CARGA['load_data_disponivel'] = False
+                print(f"⚠️ LOAD DATA LOCAL INFILE indisponível ({e}); usando to_sql.")
+    df.to_sql(tabela, engine, if_exists='append', index=False, chunksize=2000)
+
+def inserir_fato_paralelo(fact_df, registro, max_workers=PARALELISMO_CARGA):
+    """
+    Divide a fato em partições contíguas gravadas em paralelo, uma conexão por partição.
+    Partição que falha é registrada como rejeitada e as demais seguem.
+    """
+    tamanho = -(-len(fact_df) // max_workers) if len(fact_df) else 0
+    particoes = [fact_df.iloc[i:i + tamanho] for i in range(0, len(fact_df), tamanho)] if tamanho else []
+
+    def gravar(parte):
+        gravar_tabela(parte, 'fact_video')
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for p, f in [(p, pool.submit(gravar, p)) for p in particoes]:
+            try: f.result()
+            except Exception as e: registrar_falha(registro, e, len(p))
+
+def detectar_encoding(caminho, bloco=1 << 20):
+    """Valida o arquivo inteiro como UTF-8 com um decoder incremental (memória = bloco); se falhar, latin1."""
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    try:
+        with open(caminho, 'rb') as f:
+            for parte in iter(lambda: f.read(bloco), b''):
+                decoder.decode(parte)
+        decoder.decode(b'', final=True)
+        return 'utf-8'
+    except UnicodeDecodeError:
+        return 'latin1'
+
+def atribuir_chaves(valores, table_name, col, id_col, tamanho_lote=TAMANHO_LOTE_DIM):
+    """
+    Chaves de dim_hashtag/dim_tag atribuídas no cliente (o ETL é o único a gravar nelas):
+    o lookup é lido uma vez por execução e os valores novos recebem max(id)+1, +2, ...,
+    indo ao banco em lotes com o id explícito. Se algum INSERT for ignorado (valor já
+    gravado por fora, ou igual pela collation), as chaves desses valores são relidas do banco.
+    """
+    lkp = CHAVES.get(table_name)
+    if lkp is None:
+        lkp = pd.read_sql(f"SELECT {id_col}, `{col}` FROM {table_name}", engine)
+    novos = pd.Index(pd.unique(valores)).difference(pd.Index(lkp[col]))
+    if len(novos):
+        inicio = int(lkp[id_col].max()) + 1 if len(lkp) else 1
+        novos_df = pd.DataFrame({id_col: np.arange(inicio, inicio + len(novos)), col: novos.astype(object)})
+        sql = text(f"{INSERT_IGNORE} INTO {table_name} ({id_col}, `{col}`) VALUES (:{id_col}, :{col})")
+        registros = novos_df.astype(object).to_dict(orient='records')
+        inicio_t, inseridas = time.perf_counter(), 0
+        with engine.begin() as conn:
+            for i in range(0, len(registros), tamanho_lote):
+                inseridas += conn.execute(sql, registros[i:i + tamanho_lote]).rowcount
+        duracao = max(time.perf_counter() - inicio_t, 1e-9)
+        print(f" Dim: {table_name} | {len(registros)} novas chaves atribuídas no cliente | {len(registros) / duracao:,.0f} linhas/s")
+        if inseridas != len(registros):
+            consulta = text(f"SELECT {id_col}, `{col}` FROM {table_name} WHERE `{col}` IN :valores").bindparams(bindparam('valores', expanding=True))
+            lista = novos_df[col].tolist()
+            with engine.connect() as conn:
+                novos_df = pd.concat([pd.read_sql(consulta, conn, params={'valores': lista[i:i + tamanho_lote]})
+                                      for i in range(0, len(lista), tamanho_lote)], ignore_index=True)
+        lkp = pd.concat([lkp, novos_df], ignore_index=True)
+    CHAVES[table_name] = lkp
+    return lkp
+
+def construir_bridge(pares, table_name, col, id_col, tabela_bridge, registro):
+    """pares (video_id, valor) -> ids da dimensão por map vetorizado -> bridge gravada numa única carga em massa."""
+    lkp = atribuir_chaves(pares['valor'], table_name, col, id_col)
+    mapa = pd.Series(lkp[id_col].to_numpy(), index=lkp[col].to_numpy())
+    mapa = mapa[~mapa.index.duplicated(keep='last')]
+    b = pd.DataFrame({'video_id': pares['video_id'].to_numpy(), id_col: pares['valor'].map(mapa).to_numpy()})
+    b = b.dropna().drop_duplicates().astype('int64')
+    registro['saida'] = len(b)
+    try: gravar_tabela(b, tabela_bridge)
+    except Exception as e: registrar_falha(registro, e, len(b)); registro['saida'] = 0
+
+def ler_video_ids(row_ids, tamanho_lote=TAMANHO_LOTE_DIM):
+    """row_id -> video_id só das linhas do chunk, em vez da fato inteira a cada chunk."""
+    consulta = text("SELECT row_id, video_id FROM fact_video WHERE row_id IN :ids").bindparams(bindparam('ids', expanding=True))
+    valores = pd.unique(row_ids).tolist()
+    with engine.connect() as conn:
+        partes = [pd.read_sql(consulta, conn, params={'ids': valores[i:i + tamanho_lote]})
+                  for i in range(0, len(valores), tamanho_lote)]
+    return pd.concat(partes, ignore_index=True) if partes else pd.DataFrame(columns=['row_id', 'video_id'])
+
+
+# 3. PIPELINE PRINCIPAL
+# Coluna do CSV -> coluna da fato
+COL_MAP_FATO = {
+    'row_id': 'row_id', 'platform_id': 'platform_id', 'country_id': 'country_id',
+    'language_id': 'language_id', 'category_id': 'category_id', 'creator_id': 'creator_id',
+    'sound_id': 'sound_id', 'device_id': 'device_id', 'traffic_source_id': 'traffic_source_id',
+    'region_id': 'region_id', 'time_bucket_id': 'time_bucket_id',
+    'publish_date_approx': 'publish_date_approx', 'publish_dayofweek': 'publish_dayofweek',
+    'publish_period': 'publish_period', 'week_of_year': 'week_of_year',
+    'upload_hour': 'upload_hour', 'is_weekend': 'is_weekend', 'title': 'title',
+    'title_keywords': 'title_keywords', 'title_length': 'title_length',
+    'has_emoji': 'has_emoji', 'duration_sec': 'duration_sec', 'genre': 'genre',
+    'category': 'category_text', 'trend_label': 'trend_label', 'trend_type': 'trend_type',
+    'trend_duration_days': 'trend_duration_days', 'engagement_velocity': 'engagement_velocity',
+    'season': 'season', 'event_season': 'event_season', 'source_hint': 'source_hint',
+    'notes': 'notes', 'tags': 'tags_raw', 'sample_comments': 'sample_comments',
+    'device_type': 'device_type_raw', 'device_brand': 'device_brand_raw',
+    'views': 'views', 'likes': 'likes', 'comments': 'comments', 'shares': 'shares',
+    'saves': 'saves', 'dislikes': 'dislikes', 'creator_avg_views': 'creator_avg_views',
+    'engagement_total': 'engagement_total', 'engagement_rate': 'engagement_rate',
+    'like_rate': 'like_rate', 'dislike_rate': 'dislike_rate', 'comment_ratio': 'comment_ratio',
+    'share_rate': 'share_rate', 'save_rate': 'save_rate', 'like_dislike_ratio': 'like_dislike_ratio',
+    'engagement_per_1k': 'engagement_per_1k', 'engagement_like_rate': 'engagement_like_rate',
+    'engagement_comment_rate': 'engagement_comment_rate', 'engagement_share_rate': 'engagement_share_rate',
+    'avg_watch_time_sec': 'avg_watch_time_sec', 'completion_rate': 'completion_rate'
+}
+
+def carregar_chunk(df, completo, atuais, hashes, totais):
+    """Leva um chunk do CSV por todas as etapas: incremental, datas, dimensões, fato, bridges e hashes."""
+    with etapa("Hash das linhas", len(df)):
+        df['row_hash'] = hash_linhas(df)
+
+    alteradas = pd.Series(dtype='int64')
+    if not completo:
+        with etapa("Incremental (row_id + hash)", len(df)) as r:
+            lidas = len(df)
+            df, alteradas = separar_incremental(df, atuais, hashes)
+            r['saida'] = len(df)
+            totais['sem_mudanca'] = totais.get('sem_mudanca', 0) + lidas - len(df)
+        if df.empty:
+            return
+
+    with etapa("Datas", len(df)) as r:
+        df['publish_date_approx'] = df['publish_date_approx'].astype(str).str.strip().str.split(' ').str[0]
+        df['publish_date_approx'], rel_datas = corrigir_datas(df['publish_date_approx'])
+        for k, v in rel_datas.items():
+            totais[k] = totais.get(k, 0) + v
+        sem_data = df['publish_date_approx'].isna()
+        if sem_data.any():
+            # O hash das descartadas é registrado para não voltarem a cada execução; se a linha já
+            # estava na fato, a versão anterior (e as bridges dela) é mantida
+            registrar_hashes(engine, df[sem_data])
+            df = df[~sem_data]
+        r['rejeitadas'] = rel_datas.get('descartadas', 0)
+        if df.empty:
+            return
+        totais['data_max'] = max(totais.get('data_max', df['publish_date_approx'].max()), df['publish_date_approx'].max())
+
+        df['publish_date_approx'] = df['publish_date_approx'].dt.date
+        df['year_month'] = pd.to_datetime(df['publish_date_approx']).dt.strftime('%Y-%m')
+        df = df.replace({np.nan: None})
+
+    # Dimensões em paralelo; as colunas de id são atribuídas aqui, no thread principal
+    with etapa("Dimensões (paralelo)", len(df)):
+        for col, ids in carregar_dimensoes(df).items():
+            df[col] = ids
 
     # FATO
-    print(" Inserindo Fact Video...")
-    col_map = {
-        'row_id': 'row_id', 'platform_id': 'platform_id', 'country_id': 'country_id',
-        'language_id': 'language_id', 'category_id': 'category_id', 'creator_id': 'creator_id',
-        'sound_id': 'sound_id', 'device_id': 'device_id', 'traffic_source_id': 'traffic_source_id',
-        'region_id': 'region_id', 'time_bucket_id': 'time_bucket_id',
-        'publish_date_approx': 'publish_date_approx', 'publish_dayofweek': 'publish_dayofweek',
-        'publish_period': 'publish_period', 'week_of_year': 'week_of_year',
-        'upload_hour': 'upload_hour', 'is_weekend': 'is_weekend', 'title': 'title',
-        'title_keywords': 'title_keywords', 'title_length': 'title_length',
-        'has_emoji': 'has_emoji', 'duration_sec': 'duration_sec', 'genre': 'genre',
-        'category': 'category_text', 'trend_label': 'trend_label', 'trend_type': 'trend_type',
-        'trend_duration_days': 'trend_duration_days', 'engagement_velocity': 'engagement_velocity',
-        'season': 'season', 'event_season': 'event_season', 'source_hint': 'source_hint',
-        'notes': 'notes', 'tags': 'tags_raw', 'sample_comments': 'sample_comments',
-        'device_type': 'device_type_raw', 'device_brand': 'device_brand_raw',
-        'views': 'views', 'likes': 'likes', 'comments': 'comments', 'shares': 'shares',
-        'saves': 'saves', 'dislikes': 'dislikes', 'creator_avg_views': 'creator_avg_views',
-        'engagement_total': 'engagement_total', 'engagement_rate': 'engagement_rate',
-        'like_rate': 'like_rate', 'dislike_rate': 'dislike_rate', 'comment_ratio': 'comment_ratio',
-        'share_rate': 'share_rate', 'save_rate': 'save_rate', 'like_dislike_ratio': 'like_dislike_ratio',
-        'engagement_per_1k': 'engagement_per_1k', 'engagement_like_rate': 'engagement_like_rate',
-        'engagement_comment_rate': 'engagement_comment_rate', 'engagement_share_rate': 'engagement_share_rate',
-        'avg_watch_time_sec': 'avg_watch_time_sec', 'completion_rate': 'completion_rate'
-    }
-    fact_df = df.rename(columns={k: v for k, v in col_map.items() if k in df.columns})
-    final_cols = list(col_map.values())
-    fact_final = fact_df[[c for c in final_cols if c in fact_df.columns]].copy()
-    
-    try: fact_final.to_sql('fact_video', engine, if_exists='append', index=False, chunksize=2000)
-    except Exception as e: print(f"⚠️ Erro Fato: {e}")
+    fact_final = df[[c for c in COL_MAP_FATO if c in df.columns]].rename(columns=COL_MAP_FATO)
+    ja_existe = fact_final['row_id'].astype(str).isin(alteradas.index)
+    with etapa("Fato (inserção)", int((~ja_existe).sum())) as r:
+        inserir_fato_paralelo(fact_final[~ja_existe], r)
+    if ja_existe.any():
+        with etapa("Fato (alteradas)", int(ja_existe.sum())):
+            atualizar_fato(engine, fact_final[ja_existe])
+            # Só as linhas regravadas na fato: as descartadas nas datas ficam com as bridges que tinham
+            limpar_bridges(engine, alteradas[alteradas.index.isin(fact_final.loc[ja_existe, 'row_id'].astype(str))])
+    totais['novas'] = totais.get('novas', 0) + int((~ja_existe).sum())
+    totais['alteradas'] = totais.get('alteradas', 0) + int(ja_existe.sum())
+    del fact_final
 
-    # 7. BRIDGES
-    print("🔗 Bridges...")
-    v_map = dict(zip(pd.read_sql("SELECT row_id, video_id FROM fact_video", engine)['row_id'], pd.read_sql("SELECT row_id, video_id FROM fact_video", engine)['video_id']))
-    df['video_id'] = df['row_id'].map(v_map)
+    # BRIDGES (só as linhas do chunk)
+    with etapa("Lookup video_id", len(df)) as r:
+        v_lkp = ler_video_ids(df['row_id'])
+        df['video_id'] = df['row_id'].map(dict(zip(v_lkp['row_id'], v_lkp['video_id'])))
+        r['saida'] = df['video_id'].notna().sum()
 
     if 'hashtag' in df.columns:
-        hts = df[['hashtag']].dropna().drop_duplicates()
-        with engine.begin() as conn:
-            for h in hts['hashtag']: conn.execute(text("INSERT IGNORE INTO dim_hashtag (hashtag) VALUES (:h)"), {'h': h})
-        h_map = dict(zip(pd.read_sql("SELECT hashtag, hashtag_id FROM dim_hashtag", engine)['hashtag'], pd.read_sql("SELECT hashtag, hashtag_id FROM dim_hashtag", engine)['hashtag_id']))
-        b = df[['video_id', 'hashtag']].dropna(); b['hashtag_id'] = b['hashtag'].map(h_map); b = b[['video_id', 'hashtag_id']].dropna().drop_duplicates()
-        try: b.to_sql('bridge_video_hashtag', engine, if_exists='append', index=False)
-        except: pass
+        pares = pd.DataFrame({'video_id': df['video_id'], 'valor': df['hashtag']}).dropna()
+        with etapa("Bridge hashtag", len(pares)) as r:
+            construir_bridge(pares, 'dim_hashtag', 'hashtag', 'hashtag_id', 'bridge_video_hashtag', r)
 
     if 'tags' in df.columns:
-        if 'tags_list' not in df.columns: df['tags_list'] = df['tags'].astype(str).str.split(', ')
-        exp = df[['video_id', 'tags_list']].explode('tags_list').dropna(); exp['tag'] = exp['tags_list'].str.strip(); exp = exp[exp['tag']!='']
-        with engine.begin() as conn:
-            for t in exp['tag'].unique(): conn.execute(text("INSERT IGNORE INTO dim_tag (tag) VALUES (:t)"), {'t': t})
-        t_map = dict(zip(pd.read_sql("SELECT tag, tag_id FROM dim_tag", engine)['tag'], pd.read_sql("SELECT tag, tag_id FROM dim_tag", engine)['tag_id']))
-        exp['tag_id'] = exp['tag'].map(t_map); b = exp[['video_id', 'tag_id']].dropna().drop_duplicates()
-        try: b.to_sql('bridge_video_tag', engine, if_exists='append', index=False)
-        except: pass
+        # Explode/strip/dedup vetorizados sobre a coluna de tags separadas por ', '
+        tags = df['tags_list'] if 'tags_list' in df.columns else df['tags'].astype(str).str.split(', ')
+        pares = pd.DataFrame({'video_id': df['video_id'], 'valor': tags}).explode('valor').dropna()
+        pares['valor'] = pares['valor'].str.strip()
+        pares = pares[pares['valor'] != '']
+        with etapa("Bridge tag", len(pares)) as r:
+            construir_bridge(pares, 'dim_tag', 'tag', 'tag_id', 'bridge_video_tag', r)
+
+    with etapa("Hashes (etl_row_hash)", len(df)):
+        registrar_hashes(engine, df)
+
+def main():
+    parser = argparse.ArgumentParser(description="Carga do DW a partir do CSV.")
+    parser.add_argument('--completo', action='store_true',
+                        help="Esvazia todas as tabelas e recarrega tudo (padrão: incremental por row_id + hash).")
+    parser.add_argument('--chunk', type=int, default=TAMANHO_CHUNK_CSV,
+                        help=f"Linhas do CSV por chunk (padrão: {TAMANHO_CHUNK_CSV}).")
+    parser.add_argument('--backend', choices=['to_sql', 'load_data'], default='to_sql',
+                        help="Carga da fato e das bridges: to_sql (padrão) ou load_data (LOAD DATA LOCAL INFILE, "
+                             "com volta automática para to_sql se o servidor não permitir).")
+    parser.add_argument('--csv', default=file_path,
+                        help=f"CSV de entrada (padrão: {CSV_NAME}).")
+    parser.add_argument('--run-id', default=None,
+                        help="Identificador da execução em etl_run_log e no JSON de logs/ (padrão: uuid aleatório).")
+    parser.add_argument('--memoria', action='store_true',
+                        help="Pico de memória por etapa via tracemalloc (alocações Python da etapa) em vez do pico de RSS. "
+                             "Deixa as etapas que mais alocam até ~15x mais lentas: só para diagnóstico.")
+    args = parser.parse_args()
+    CARGA.update(backend=args.backend, load_data_disponivel=True)
+
+    print("\n Iniciando Pipeline...")
+    METRICAS.clear()
+    CHAVES.clear()
+    execucao = {'run_id': args.run_id or uuid.uuid4().hex, 'iniciado_em': pd.Timestamp.now().floor('s').to_pydatetime(),
+                'modo': 'completo' if args.completo else 'incremental', 'arquivo': os.path.basename(args.csv),
+                'chunk': args.chunk, 'backend': args.backend, 'memoria': 'tracemalloc' if args.memoria else 'rss',
+                'status': 'erro'}
+    if args.memoria:
+        tracemalloc.start()
+    try:
+        executar_pipeline(args, execucao)
+    finally:
+        tracemalloc.stop()
+        execucao['duracao_s'] = round((pd.Timestamp.now() - pd.Timestamp(execucao['iniciado_em'])).total_seconds(), 2)
+        resumo_etapas()
+        gravar_log_execucao(engine, execucao)
+
+def executar_pipeline(args, execucao):
+    criar_tabela_hash(engine)
+    if args.completo:
+        limpar_banco(engine)
+
+    with etapa("Detecção de encoding"):
+        encoding = detectar_encoding(args.csv)
+    execucao['encoding'] = encoding
+    print(f" CSV: {os.path.basename(args.csv)} ({encoding}), chunks de {args.chunk} linhas")
+
+    atuais, hashes = (None, None) if args.completo else ler_estado_atual(engine)
+    totais, lidas = {}, 0
+    leitor = pd.read_csv(args.csv, encoding=encoding, chunksize=args.chunk)
+    while True:
+        with etapa("Leitura do CSV") as r:
+            df = next(leitor, None)
+            r['saida'] = 0 if df is None else len(df)
+        if df is None:
+            break
+        lidas += len(df)
+        carregar_chunk(df, args.completo, atuais, hashes, totais)
+        print(f" 📦 {lidas} linhas processadas")
+        del df
+    execucao['totais'] = totais
+
+    print(f" Datas: {totais.get('formato_ydm', 0)} no formato AAAA-DD-MM, {totais.get('formato_padrao', 0)} no formato padrão, "
+          f"{totais.get('invertidas_corrigidas', 0)} com dia/mês invertidos corrigidas.")
+    if totais.get('descartadas'):
+        print(f"⚠️ {totais['descartadas']} linhas com datas irrecuperáveis removidas.")
+    print(f" Nova Data Máxima: {totais.get('data_max')}")
+    if not args.completo:
+        print(f"🔁 Incremental: {totais.get('novas', 0)} novas, {totais.get('alteradas', 0)} alteradas, {totais.get('sem_mudanca', 0)} sem mudança.")
+    if not totais.get('novas') and not totais.get('alteradas'):
+        print("\n Nada a atualizar: banco já reflete o CSV.")
+        execucao['status'] = 'sem_mudanca'
+        return
+
+    # CUBO AGREGADO (lido pelo dashboard)
+    print("🧊 Construindo cubo agregado...")
+    with etapa("Cubo agregado"):
+        cubo = construir_cubo(engine)
+    print(f" Cubo: {len(cubo)} linhas.")
 
     print("\n SUCESSO! Banco carregado.")
+    execucao['status'] = 'ok'
 
 if __name__ == "__main__":
     main()
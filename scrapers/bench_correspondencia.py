@@ -0,0 +1,98 @@
+import os
+import re
+import sys
+import time
+from difflib import SequenceMatcher
+
+import numpy as np
+
+from correspondencia import IndiceHits, casar_em_paralelo
+
+# Benchmark do casamento track x hit: varredura completa (como era no atualizar_dw) x IndiceHits.
+# Uso: [MATCH_WORKERS=4] python bench_correspondencia.py [sons ...]   (padrão: 10000 100000 1000000)
+# A varredura só roda numa amostra; o resultado do índice é conferido contra ela.
+
+LIMIAR = 0.72          # MATCH_THRESHOLD do music_charts_history (que exige DB_CREDENTIALS ao importar)
+N_HITS = 200           # tamanho do chart diário do kworb
+AMOSTRA_VARREDURA = 2000
+WORKERS = int(os.getenv('MATCH_WORKERS', os.cpu_count() or 1))
+
+PALAVRAS = ("love night dance baby heart fire girl boy money dream summer city lights party down back time "
+            "world wild young blue gold rain stars feel crazy alone forever again tonight ocean espresso "
+            "butterfly shadow moon sunrise lonely paradise midnight sugar honey thunder").split()
+
+def limpar_texto(t):
+    if not t: return ""
+    return re.sub(r"[^\w\s]", "", str(t).lower()).strip()
+
+def gerar_hits(rng):
+    hits = [" ".join(rng.choice(PALAVRAS, rng.integers(1, 4))) for _ in range(N_HITS)]
+    return [limpar_texto(h) for h in hits]
+
+def gerar_sons(n, hits, rng):
+    """Mistura nomes de hits exatos, variações (sufixos, erros de digitação) e sons originais sem relação."""
+    tipo = rng.integers(0, 10, n)
+    sons = []
+    for t in tipo:
+        hit = hits[rng.integers(0, len(hits))]
+        if t == 0:
+            sons.append(hit)
+        elif t == 1:
+            sons.append(f"{hit} (sped up)")
+        elif t == 2 and len(hit) > 4:
+            i = int(rng.integers(0, len(hit)))
+            sons.append(hit[:i] + hit[i + 1:])
+        elif t < 6:
+            sons.append(" ".join(rng.choice(PALAVRAS, rng.integers(1, 5))))
+        else:
+            sons.append(f"original sound - user{rng.integers(0, n)}")
+    return [limpar_texto(s) for s in sons]
+
+def casar_varredura(tracks, hits):
+    """Regra original do atualizar_dw: primeiro hit do ranking com ratio >= limiar ou que contém/está contido."""
+    resultado = []
+    for track_db in tracks:
+        pos = -1
+        if len(track_db) >= 3:
+            for i, nome_hit in enumerate(hits):
+                if SequenceMatcher(None, nome_hit, track_db).ratio() >= LIMIAR or nome_hit in track_db or track_db in nome_hit:
+                    pos = i
+                    break
+        resultado.append(pos)
+    return np.array(resultado)
+
+def main():
+    tamanhos = [int(a) for a in sys.argv[1:]] or [10_000, 100_000, 1_000_000]
+    rng = np.random.default_rng(42)
+    hits = gerar_hits(rng)
+
+    t0 = time.perf_counter()
+    indice = IndiceHits(hits, LIMIAR)
+    print(f"📇 Índice de {len(hits)} hits em {time.perf_counter() - t0:.3f}s ({len(indice.postings)} trigramas)")
+
+    amostra = gerar_sons(AMOSTRA_VARREDURA, hits, rng)
+    t0 = time.perf_counter()
+    esperado = casar_varredura(amostra, hits)
+    t_varredura = time.perf_counter() - t0
+    assert (indice.casar(amostra) == esperado).all(), "IndiceHits divergiu da varredura completa"
+    vel_varredura = len(amostra) / t_varredura
+    print(f"✅ Idêntico à varredura em {len(amostra)} sons ({(esperado >= 0).sum()} matches). "
+          f"Varredura: {vel_varredura:,.0f} sons/s")
+
+    for n in tamanhos:
+        sons = gerar_sons(n, hits, rng)
+        t0 = time.perf_counter()
+        posicoes = indice.casar(sons)
+        t_indice = time.perf_counter() - t0
+        print(f"⏱️ {n:>9,} sons: índice {t_indice:6.2f}s ({n / t_indice:,.0f} sons/s, {(posicoes >= 0).sum():,} matches) | "
+              f"varredura estimada {n / vel_varredura:,.0f}s | {n / vel_varredura / t_indice:.0f}x")
+        # A saída não pode depender do número de workers
+        for workers in sorted({2, 3, WORKERS}):
+            t0 = time.perf_counter()
+            paralelo = casar_em_paralelo(hits, LIMIAR, sons, workers=workers)
+            t_paralelo = time.perf_counter() - t0
+            assert (paralelo == posicoes).all(), f"casar_em_paralelo divergiu com {workers} workers"
+            print(f"   {workers} workers: {t_paralelo:6.2f}s ({n / t_paralelo:,.0f} sons/s, {t_indice / t_paralelo:.1f}x)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+# correspondencia.py
+# Casamento de music_track com os hits do chart sem comparar todo som com todo hit
+import gzip
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+from difflib import SequenceMatcher
+
+import numpy as np
+import pandas as pd
+
+# Teto do array temporário (tracks x hits x alfabeto) do quick_ratio; acima disso os hits vão em fatias
+MEMORIA_RATIO = 64 * 1024 * 1024
+
+def ngramas(texto, n=3):
+    return {texto[i:i + n] for i in range(len(texto) - n + 1)}
+
+class IndiceHits:
+    """
+    Índice invertido de trigramas sobre os nomes (já limpos) dos hits, para achar o primeiro hit
+    do ranking com similaridade >= limiar ou em que um nome contém o outro.
+
+    O resultado é exatamente o da varredura completa, porque a lista curta de cada track contém
+    todo hit que pode casar:
+    - "um contém o outro" exige um trigrama em comum (hits com menos de 3 caracteres entram sempre);
+    - ratio() nunca passa de quick_ratio() (multiconjunto de caracteres), calculado em numpy
+      para todos os hits de uma vez.
+    Na lista curta vale a mesma regra de antes, em ordem de ranking, parando no primeiro que casar.
+    """
+    def __init__(self, nomes, limiar, n=3, bloco=512):
+        self.nomes = list(nomes)
+        self.limiar = limiar
+        self.n = n
+        self.bloco = bloco
+        self.sempre = {i for i, h in enumerate(self.nomes) if len(h) < n}
+        self.postings = {}
+        for i, h in enumerate(self.nomes):
+            for g in ngramas(h, n):
+                self.postings.setdefault(g, []).append(i)
+
+        # Histograma de caracteres por hit; a última coluna recebe os caracteres que nenhum hit tem (sempre 0)
+        self.alfabeto = np.array(sorted({ord(c) for h in self.nomes for c in h}), dtype=np.uint32)
+        self.tamanhos = np.array([len(h) for h in self.nomes], dtype=np.int64)
+        self.hist = self.histogramas(self.nomes)
+
+    def histogramas(self, textos):
+        """Contagem de cada caractere do alfabeto dos hits, uma linha por texto (sem loop por caractere)."""
+        largura = len(self.alfabeto) + 1
+        tamanhos = np.array([len(t) for t in textos], dtype=np.int64)
+        pontos = np.frombuffer("".join(textos).encode("utf-32-le"), dtype=np.uint32)
+        coluna = np.searchsorted(self.alfabeto, pontos)
+        conhecido = coluna < len(self.alfabeto)
+        conhecido[conhecido] = self.alfabeto[coluna[conhecido]] == pontos[conhecido]
+        coluna[~conhecido] = largura - 1
+        linha = np.repeat(np.arange(len(textos)), tamanhos)
+        contagem = np.bincount(linha * largura + coluna, minlength=len(textos) * largura)
+        return contagem.reshape(len(textos), largura).astype(np.int32)
+
+    def candidatos_ratio(self, tracks):
+        """
+        Máscara (tracks x hits) de quem pode ter ratio() >= limiar: quick_ratio() com a mesma conta do difflib.
+        Os hits são percorridos em fatias para o temporário caber em MEMORIA_RATIO, qualquer que seja o alfabeto.
+        """
+        hist = self.histogramas(tracks)
+        por_hit = hist.shape[0] * hist.shape[1] * hist.itemsize
+        fatia = max(1, MEMORIA_RATIO // max(por_hit, 1))
+        comum = np.empty((len(tracks), len(self.nomes)), dtype=np.int64)
+        for ini in range(0, len(self.nomes), fatia):
+            parte = self.hist[ini:ini + fatia]
+            comum[:, ini:ini + fatia] = np.minimum(hist[:, None, :], parte[None, :, :]).sum(axis=2)
+        tamanhos = np.array([len(t) for t in tracks], dtype=np.int64)
+        return 2.0 * comum / (tamanhos[:, None] + self.tamanhos[None, :]) >= self.limiar
+
+    def hits_do_track(self, track, pode_ratio, todos=False):
+        """Primeiro hit da lista curta que casa com o track (-1 se nenhum) ou, com todos=True, a lista de todos."""
+        encontrados = []
+        lista = set(self.sempre)
+        for g in ngramas(track, self.n):
+            lista.update(self.postings.get(g, ()))
+        lista.update(np.flatnonzero(pode_ratio).tolist())
+
+        sm = SequenceMatcher(None, "", track)  # o lado do track é analisado uma vez só
+        for i in sorted(lista):
+            nome_hit = self.nomes[i]
+            casa = nome_hit in track or track in nome_hit
+            if not casa and pode_ratio[i]:
+                sm.set_seq1(nome_hit)
+                casa = sm.ratio() >= self.limiar
+            if casa:
+                if not todos:
+                    return i
+                encontrados.append(i)
+        return encontrados if todos else -1
+
+    def casar_unicos(self, unicos, tamanho_minimo=3, todos=False):
+        """Posição do primeiro hit que casa com cada track (sem repetidos), ou -1; com todos=True, listas de posições."""
+        resultado = [[] for _ in unicos] if todos else np.full(len(unicos), -1, dtype=np.int64)
+        if not self.nomes:
+            return resultado
+        validos = [j for j, t in enumerate(unicos) if len(t) >= tamanho_minimo]
+        for ini in range(0, len(validos), self.bloco):
+            lote = validos[ini:ini + self.bloco]
+            pode_ratio = self.candidatos_ratio([unicos[j] for j in lote])
+            for k, j in enumerate(lote):
+                resultado[j] = self.hits_do_track(unicos[j], pode_ratio[k], todos)
+        return resultado
+
+    def casar(self, tracks, tamanho_minimo=3):
+        """
+        Posição (em nomes) do primeiro hit que casa com cada track, ou -1.
+        Tracks repetidos são casados uma vez; os com menos de tamanho_minimo caracteres não casam.
+        """
+        codigos, unicos = pd.factorize(pd.Series(tracks, dtype=object))
+        resultado = self.casar_unicos(list(unicos), tamanho_minimo)
+        return np.append(resultado, -1)[codigos]  # código -1 (track nulo) cai no -1 do final
+
+MINIMO_PARALELO = 1024  # abaixo disso subir o pool custa mais que casar tudo num processo só
+
+# Índice de cada processo do pool, montado uma vez pelo initializer (os hits não viajam a cada tarefa)
+_indice_worker = None
+
+def _iniciar_worker(nomes, limiar):
+    global _indice_worker
+    _indice_worker = IndiceHits(nomes, limiar)
+
+def _casar_particao(args):
+    tracks, tamanho_minimo, todos = args
+    return _indice_worker.casar_unicos(tracks, tamanho_minimo, todos)
+
+def casar_em_paralelo(nomes, limiar, tracks, workers=None, tamanho_minimo=3, particoes_por_worker=4, todos=False):
+    """
+    Mesmo resultado de IndiceHits(nomes, limiar).casar(tracks), com os tracks distintos divididos em
+    partições contíguas num pool de processos. Cada partição devolve suas posições e a concatenação
+    segue a ordem das partições, então a saída não depende de quantos workers rodaram.
+    Com todos=True devolve, por track, a lista de todas as posições que casam (usada pelo cache).
+    """
+    workers = workers or os.cpu_count() or 1
+    codigos, unicos = pd.factorize(pd.Series(tracks, dtype=object))
+    unicos = list(unicos)
+    if workers <= 1 or len(unicos) < MINIMO_PARALELO:
+        resultado = IndiceHits(nomes, limiar).casar_unicos(unicos, tamanho_minimo, todos)
+    else:
+        n_partes = workers * particoes_por_worker  # mais partições que workers equilibra a carga
+        limites = np.linspace(0, len(unicos), n_partes + 1).astype(int)
+        partes = [(unicos[a:b], tamanho_minimo, todos) for a, b in zip(limites[:-1], limites[1:]) if b > a]
+        with ProcessPoolExecutor(max_workers=workers, initializer=_iniciar_worker, initargs=(list(nomes), limiar)) as pool:
+            blocos = list(pool.map(_casar_particao, partes))
+        resultado = [r for bloco in blocos for r in bloco] if todos else np.concatenate(blocos)
+    if todos:
+        return [resultado[c] if c >= 0 else [] for c in codigos]
+    return np.append(resultado, -1)[codigos]
+
+IDADE_MAXIMA_UNIVERSO = 90  # dias sem aparecer no chart até um nome sair do universo do cache
+
+class CacheCorrespondencia:
+    """
+    Cache persistente (JSON gzip) do casamento: para cada track limpo, os nomes de hits que casam com ele
+    dentre os nomes de hits vistos nos últimos idade_maxima dias (o "universo", nome -> último dia no chart).
+    Só vale para o mesmo limiar e tamanho mínimo; se mudarem, ou o arquivo não existir, começa vazio e o
+    resultado é o mesmo (só mais lento). Os nomes do chart de hoje sempre estão no universo, então podar
+    os antigos não muda o resultado: se um deles voltar, é casado de novo como nome inédito.
+    """
+    def __init__(self, caminho, limiar, tamanho_minimo=3, idade_maxima=IDADE_MAXIMA_UNIVERSO, hoje=None):
+        self.caminho = caminho
+        self.limiar = limiar
+        self.tamanho_minimo = tamanho_minimo
+        self.idade_maxima = idade_maxima
+        self.hoje = (hoje or date.today()).isoformat()
+        self.universo, self.matches = {}, {}
+        if not os.path.exists(caminho):
+            return
+        try:
+            with gzip.open(caminho, "rt", encoding="utf-8") as f:
+                dados = json.load(f)
+            if dados["limiar"] == limiar and dados["tamanho_minimo"] == tamanho_minimo:
+                universo = dados["universo"]
+                if isinstance(universo, list):  # formato antigo, sem data: conta como visto hoje
+                    universo = dict.fromkeys(universo, self.hoje)
+                self.universo, self.matches = universo, dados["matches"]
+        except (OSError, ValueError, KeyError) as e:
+            print(f"⚠️ Cache de correspondência ignorado ({e}).")
+
+    def casar(self, nomes, tracks, workers=None):
+        """
+        Mesmo resultado de IndiceHits(nomes, limiar).casar(tracks), refazendo só o que o cache não cobre:
+        tracks já vistos contra os nomes fora do universo, tracks novos contra o universo todo.
+        O primeiro hit de cada track sai da interseção dos seus nomes com o chart de hoje.
+        Devolve (posições, estatísticas).
+        """
+        codigos, unicos = pd.factorize(pd.Series(tracks, dtype=object))
+        unicos = list(unicos)
+        nomes_novos = list(dict.fromkeys(n for n in nomes if n not in self.universo))
+        vistos = [t for t in unicos if t in self.matches]
+        novos = [t for t in unicos if t not in self.matches]
+
+        if nomes_novos and vistos:
+            achados = casar_em_paralelo(nomes_novos, self.limiar, vistos, workers, self.tamanho_minimo, todos=True)
+            for t, posicoes in zip(vistos, achados):
+                if posicoes:
+                    self.matches[t] = self.matches[t] + [nomes_novos[i] for i in posicoes]
+        self.universo.update(dict.fromkeys(nomes, self.hoje))
+        if novos:
+            universo = sorted(self.universo)
+            achados = casar_em_paralelo(universo, self.limiar, novos, workers, self.tamanho_minimo, todos=True)
+            for t, posicoes in zip(novos, achados):
+                self.matches[t] = [universo[i] for i in posicoes]
+
+        primeira = {}
+        for i, n in enumerate(nomes):
+            primeira.setdefault(n, i)
+        resultado = np.array([min((primeira[n] for n in self.matches[t] if n in primeira), default=-1) for t in unicos],
+                             dtype=np.int64)
+        estatisticas = {'tracks': len(unicos), 'do_cache': len(vistos), 'novos': len(novos), 'nomes_novos': len(nomes_novos)}
+        return np.append(resultado, -1)[codigos], estatisticas
+
+    def podar(self):
+        """Tira do universo (e das listas de matches) os nomes que não aparecem no chart há mais de idade_maxima dias."""
+        corte = (date.fromisoformat(self.hoje) - timedelta(days=self.idade_maxima)).isoformat()
+        antigos = {n for n, visto in self.universo.items() if visto < corte}
+        if antigos:
+            self.universo = {n: visto for n, visto in self.universo.items() if n not in antigos}
+            self.matches = {t: [n for n in m if n not in antigos] for t, m in self.matches.items()}
+        return len(antigos)
+
+    def salvar(self, tracks_atuais):
+        """Grava o cache só com os tracks que ainda existem e o universo podado (escrita atômica)."""
+        self.podar()
+        atuais = set(tracks_atuais)
+        dados = {"limiar": self.limiar, "tamanho_minimo": self.tamanho_minimo,
+                 "universo": dict(sorted(self.universo.items())),
+                 "matches": {t: m for t, m in self.matches.items() if t in atuais}}
+        os.makedirs(os.path.dirname(self.caminho) or ".", exist_ok=True)
+        with gzip.open(self.caminho + ".tmp", "wt", encoding="utf-8") as f:
+            json.dump(dados, f, ensure_ascii=False)
+        os.replace(self.caminho + ".tmp", self.caminho)
@@ -1,21 +1,33 @@
+import hashlib
 import json
 import os
 import re
 import sys
 import time
-from difflib import SequenceMatcher
+from datetime import date
+from html.parser import HTMLParser
 from typing import Dict, List
-from urllib.parse import quote_plus
 
 import pandas as pd
 import requests
-from bs4 import BeautifulSoup
-from sqlalchemy import create_engine, text
+from sqlalchemy import text, bindparam
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from conexao import obter_engine
+from correspondencia import CacheCorrespondencia
+from historico_chart import criar_tabelas_historico, gravar_chart_do_dia, gravar_sons_do_dia
 
 # --- CONFIGURAÇÕES ---
 DB_CREDENTIALS_RAW = os.getenv('DB_CREDENTIALS')
 CHART_URL = "https://kworb.net/spotify/country/global_daily.html"
 MATCH_THRESHOLD = 0.72 
+MATCH_WORKERS = int(os.getenv('MATCH_WORKERS', os.cpu_count() or 1))  # processos do casamento som x hit
+# Cache track -> hits que casam, preservado entre execuções pelo actions/cache do workflow
+MATCH_CACHE = os.getenv('MATCH_CACHE', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'correspondencia.json.gz'))
+# ETag/Last-Modified e hash do último chart sincronizado (mesma pasta preservada pelo workflow)
+CHART_ESTADO = os.getenv('CHART_ESTADO', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'kworb_estado.json'))
+RE_TABELA = re.compile(r"""<table\b[^>]*\bid\s*=\s*["']?spotifydaily\b""", re.IGNORECASE)
+RE_TAG_TABELA = re.compile(r"<(/?)table\b[^>]*>", re.IGNORECASE)
 
 if not DB_CREDENTIALS_RAW:
     sys.exit(1)
@@ -23,79 +35,196 @@ if not DB_CREDENTIALS_RAW:
 creds = json.loads(DB_CREDENTIALS_RAW)
 
 def conectar_banco():
-    connection_string = f"mysql+pymysql://{creds['user']}:{quote_plus(creds['password'])}@{creds['host']}:{creds['port']}/{creds['database']}"
-    return create_engine(connection_string, connect_args={"ssl": {"ssl_mode": "REQUIRED"}})
+    return obter_engine(creds['user'], creds['password'], creds['host'], creds['port'], creds['database'], ssl=True)
 
 def limpar_texto(t):
     if not t: return ""
     return re.sub(r"[^\w\s]", "", str(t).lower()).strip()
 
+class LinhasChart(HTMLParser):
+    """
+    Extrator direcionado do tbody da tabela do chart: por linha, o número de células e o texto da 3ª,
+    juntado como no get_text(" ", strip=True) do BeautifulSoup (pedaços sem espaços nas pontas, unidos por " ").
+    Como no get_text, o conteúdo de <script>/<style> fica de fora; uma tabela aninhada numa célula conta
+    só como texto dessa célula (suas linhas não viram linhas do chart).
+    """
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.linhas = []
+        self.estado_tbody = None  # None: antes do tbody, True: dentro, False: já saiu
+        self.celulas = None       # células da linha aberta (None fora de <tr>)
+        self.textos = None        # pedaços de texto da 3ª célula, enquanto ela está aberta
+        self.terceira = ""
+        self.tabelas = 0          # <table> abertos; só a tabela do chart (nível 1) tem estrutura
+        self.em_script = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag in ("script", "style"):
+            self.em_script = True
+        elif tag == "table":
+            self.tabelas += 1
+        if self.tabelas != 1:
+            return
+        if tag == "tbody" and self.estado_tbody is None:
+            self.estado_tbody = True
+        elif not self.estado_tbody:
+            return
+        elif tag == "tr":
+            self.celulas, self.textos, self.terceira = 0, None, ""
+        elif tag == "td" and self.celulas is not None:
+            self.celulas += 1
+            if self.celulas == 3:
+                self.textos = []
+
+    def handle_endtag(self, tag):
+        if tag in ("script", "style"):
+            self.em_script = False
+        elif tag == "table":
+            self.tabelas -= 1
+        if self.tabelas != 1 or not self.estado_tbody:
+            return
+        if tag == "td" and self.textos is not None:
+            self.terceira, self.textos = " ".join(self.textos), None
+        elif tag == "tr" and self.celulas is not None:
+            if self.textos is not None:  # 3ª célula sem </td>
+                self.terceira, self.textos = " ".join(self.textos), None
+            self.linhas.append((self.celulas, self.terceira))
+            self.celulas = None
+        elif tag == "tbody":
+            self.estado_tbody = False
+
+    def handle_data(self, data):
+        if self.textos is not None and not self.em_script and data.strip():
+            self.textos.append(data.strip())
+
+def fim_da_tabela(html, inicio):
+    """Posição logo depois do </table> que fecha a tabela aberta em `inicio` (pulando tabelas aninhadas)."""
+    nivel = 0
+    for tag in RE_TAG_TABELA.finditer(html, inicio):
+        nivel += -1 if tag.group(1) else 1
+        if nivel == 0:
+            return tag.end()
+    return len(html)
+
 def extrair_hits_do_html(html):
-    soup = BeautifulSoup(html, "html.parser")
-    tabela = soup.find("table", {"id": "spotifydaily"}) # ID específico do código fonte
-    
-    if not tabela:
+    # Só o trecho da tabela vai para o parser (o resto da página é ignorado)
+    inicio = RE_TABELA.search(html)
+    if not inicio:
         print("❌ Tabela 'spotifydaily' não encontrada.")
         return []
+    parser = LinhasChart()
+    parser.feed(html[inicio.start():fim_da_tabela(html, inicio.start())])
+    parser.close()
 
     hits = []
-    linhas = tabela.find("tbody").find_all("tr")
-    
-    for linha in linhas:
-        colunas = linha.find_all("td")
-        if len(colunas) >= 3:
-            # Pega o texto da coluna que contém 'Artista - Música'
-            # No Kworb, o texto dentro da div separa os dois por " - "
-            texto_completo = colunas[2].get_text(" ", strip=True)
-            
-            if " - " in texto_completo:
-                # Divide e pega apenas a parte da Música (índice 1)
-                partes = texto_completo.split(" - ", 1)
-                musica = partes[1]
-                
-                hits.append({
-                    "musica_limpa": limpar_texto(musica),
-                    "rank": len(hits) + 1
-                })
-    
+    for n_celulas, texto_completo in parser.linhas:
+        # No Kworb a 3ª coluna traz 'Artista - Música'; fica só a parte da Música
+        if n_celulas >= 3 and " - " in texto_completo:
+            musica = texto_completo.split(" - ", 1)[1]
+            hits.append({
+                "musica_limpa": limpar_texto(musica),
+                "rank": len(hits) + 1
+            })
+
     print(f"✅ {len(hits)} hits oficiais extraídos do HTML.")
     return hits
 
-def atualizar_dw(engine, hits_top):
+def baixar_chart(url, caminho_estado):
+    """
+    GET condicional com o ETag/Last-Modified da última sincronização, mais o hash do conteúdo
+    (nem todo servidor responde 304). Devolve (html, estado); html é None se o chart não mudou.
+    """
+    estado = {}
+    if os.path.exists(caminho_estado):
+        with open(caminho_estado, encoding="utf-8") as f:
+            estado = json.load(f)
+    headers = {"User-Agent": "Mozilla/5.0"}
+    if estado.get("etag"):
+        headers["If-None-Match"] = estado["etag"]
+    if estado.get("last_modified"):
+        headers["If-Modified-Since"] = estado["last_modified"]
+
+    res = requests.get(url, headers=headers, timeout=20)
+    if res.status_code == 304:
+        print("💤 Chart sem mudanças desde a última sincronização (304).")
+        return None, estado
+    res.raise_for_status()
+    novo = {"etag": res.headers.get("ETag"), "last_modified": res.headers.get("Last-Modified"),
+            "sha256": hashlib.sha256(res.content).hexdigest()}
+    if novo["sha256"] == estado.get("sha256"):
+        print("💤 Chart idêntico ao da última sincronização (mesmo hash).")
+        return None, novo
+    return res.text, novo
+
+def salvar_estado(caminho_estado, estado):
+    os.makedirs(os.path.dirname(caminho_estado), exist_ok=True)
+    with open(caminho_estado, "w", encoding="utf-8") as f:
+        json.dump(estado, f)
+
+def atualizar_dw(engine, hits_top, data=None):
+    """
+    Sincroniza is_global_hit/chart_rank pela diferença entre o estado atual de dim_sound e o chart de hoje:
+    só as linhas que entram, mudam de rank ou saem do chart são escritas. Na mesma transação grava o chart
+    do dia em fact_chart_history e o vínculo som -> rank em fact_chart_sound_history: se algo falhar, nenhum
+    dos três muda. Devolve quantas linhas de dim_sound foram tocadas.
+    """
+    data = data or date.today()
+    # Leitura numa conexão curta: o casamento (pool de processos) roda sem transação aberta no banco
+    with engine.connect() as conn:
+        df_sons = pd.read_sql("SELECT sound_id, music_track, is_global_hit, chart_rank FROM dim_sound", conn)
+    tracks = df_sons["music_track"].map(limpar_texto)
+
+    # Lógica Híbrida: Similaridade ou Contém, com o primeiro hit do ranking que casar
+    cache = CacheCorrespondencia(MATCH_CACHE, MATCH_THRESHOLD, hoje=data)
+    posicoes, stats = cache.casar([hit["musica_limpa"] for hit in hits_top], tracks, workers=MATCH_WORKERS)
+    print(f"🧠 {stats['tracks']} tracks: {stats['do_cache']} do cache, {stats['novos']} novos; "
+          f"{stats['nomes_novos']} nomes inéditos no chart.")
+
+    novo_rank = pd.Series([hits_top[p]["rank"] if p >= 0 else None for p in posicoes], dtype="Int64")
+    rank_atual = pd.to_numeric(df_sons["chart_rank"]).astype("Int64")
+    entrou = novo_rank.notna() & (df_sons["is_global_hit"].ne(1) | rank_atual.ne(novo_rank).fillna(True))
+    saiu = novo_rank.isna() & (df_sons["is_global_hit"].ne(0) | rank_atual.notna())
+
+    updates = [{"p_rank": int(r), "p_id": int(s)} for s, r in zip(df_sons.loc[entrou, "sound_id"], novo_rank[entrou])]
+    saidas = [int(s) for s in df_sons.loc[saiu, "sound_id"]]
+    no_chart = novo_rank.notna()
+    sons_do_dia = list(zip(df_sons.loc[no_chart, "sound_id"], novo_rank[no_chart]))
+    batch_size = 100
+    criar_tabelas_historico(engine)  # DDL fora da transação (commit implícito no MySQL)
+    # A transação só cobre as escritas: UPDATEs, chart do dia e vínculo som -> rank
     with engine.begin() as conn:
-        conn.execute(text("UPDATE dim_sound SET is_global_hit = 0, chart_rank = NULL"))
-        df_sons = pd.read_sql("SELECT sound_id, music_track FROM dim_sound", conn)
-        
-        updates = []
-        for _, row in df_sons.iterrows():
-            track_db = limpar_texto(row["music_track"])
-            if len(track_db) < 3: continue
-
-            for hit in hits_top:
-                nome_hit = hit["musica_limpa"]
-                # Lógica Híbrida: Similaridade ou Contém
-                if SequenceMatcher(None, nome_hit, track_db).ratio() >= MATCH_THRESHOLD or nome_hit in track_db or track_db in nome_hit:
-                    updates.append({"p_rank": hit["rank"], "p_id": row["sound_id"]})
-                    break
-        
-        if updates:
-            print(f"🚀 Enviando {len(updates)} matches para o banco...")
-            batch_size = 100
-            for i in range(0, len(updates), batch_size):
-                conn.execute(
-                    text("UPDATE dim_sound SET is_global_hit = 1, chart_rank = :p_rank WHERE sound_id = :p_id"),
-                    updates[i : i + batch_size]
-                )
-            print("✨ Sincronização concluída!")
-        else:
-            print("⚠️ Nenhum vídeo no banco corresponde aos hits de hoje.")
+        for i in range(0, len(updates), batch_size):
+            conn.execute(
+                text("UPDATE dim_sound SET is_global_hit = 1, chart_rank = :p_rank WHERE sound_id = :p_id"),
+                updates[i : i + batch_size]
+            )
+        reset = text("UPDATE dim_sound SET is_global_hit = 0, chart_rank = NULL WHERE sound_id IN :ids").bindparams(
+            bindparam("ids", expanding=True))
+        for i in range(0, len(saidas), batch_size):
+            conn.execute(reset, {"ids": saidas[i : i + batch_size]})
+        gravadas = gravar_chart_do_dia(conn, hits_top, data)
+        gravar_sons_do_dia(conn, sons_do_dia, data)
+
+    cache.salvar(tracks)
+    print(f"🗂️ Histórico: {gravadas} posições novas em fact_chart_history para {data}.")
+    if not no_chart.any():
+        print("⚠️ Nenhum vídeo no banco corresponde aos hits de hoje.")
+    tocadas = len(updates) + len(saidas)
+    print(f"✨ Sincronização concluída: {tocadas} linhas tocadas ({len(updates)} entraram ou mudaram de rank, "
+          f"{len(saidas)} saíram do chart, {len(df_sons) - tocadas} sem mudança).")
+    return tocadas
 
 if __name__ == "__main__":
     try:
         engine = conectar_banco()
-        res = requests.get(CHART_URL, headers={"User-Agent": "Mozilla/5.0"}, timeout=20)
-        ranking = extrair_hits_do_html(res.text)
-        if ranking:
-            atualizar_dw(engine, ranking)
+        html, estado = baixar_chart(CHART_URL, CHART_ESTADO)
+        if html is None:
+            salvar_estado(CHART_ESTADO, estado)  # nada a parsear nem sincronizar
+        else:
+            ranking = extrair_hits_do_html(html)
+            if ranking:
+                atualizar_dw(engine, ranking, date.today())
+                # Só depois da sincronização: se ela falhar, o próximo GET baixa e processa de novo
+                salvar_estado(CHART_ESTADO, estado)
     except Exception as e:
         print(f"💥 ERRO: {e}")
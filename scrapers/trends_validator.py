@@ -1,7 +1,6 @@
 import pandas as pd
 from pytrends.request import TrendReq
-from sqlalchemy import create_engine, text
-from urllib.parse import quote_plus
+from sqlalchemy import text
 from collections import Counter
 import sys
 import os
@@ -10,6 +9,9 @@ import re
 import json
 import warnings
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from conexao import obter_engine
+
 # --- SILENCIAR AVISOS DE DEPRECIAÇÃO ---
 warnings.filterwarnings("ignore", category=FutureWarning)
 pd.set_option('future.no_silent_downcasting', True)
@@ -33,8 +35,7 @@ except Exception as e:
     sys.exit(1)
 
 def conectar_banco():
-    connection_string = f"mysql+pymysql://{DB_USER}:{quote_plus(DB_PASS)}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
-    return create_engine(connection_string, connect_args={"ssl": {"ssl_mode": "REQUIRED"}})
+    return obter_engine(DB_USER, DB_PASS, DB_HOST, DB_PORT, DB_NAME, ssl=True)
 
 def obter_top_keywords(engine, limit=20):
     print(f"🔍 Analisando banco de dados para encontrar Top {limit} Keywords...")
@@ -0,0 +1,39 @@
+# sql_estrela.py
+# Vocabulário SQL do star schema, compartilhado pelo dashboard e pelo ETL
+from config import DURATION_BINS, DURATION_LABELS
+
+JOINS_ESTRELA = """
+FROM fact_video v
+JOIN dim_country c ON v.country_id = c.country_id
+JOIN dim_platform p ON v.platform_id = p.platform_id
+JOIN dim_category cat ON v.category_id = cat.category_id
+JOIN dim_device d ON v.device_id = d.device_id
+JOIN dim_region r ON v.region_id = r.region_id
+JOIN dim_time_bucket t ON v.time_bucket_id = t.time_bucket_id
+JOIN dim_sound s ON v.sound_id = s.sound_id
+"""
+
+def expr_duration_bin(coluna='v.duration_sec'):
+    """CASE equivalente ao pd.cut(duration_sec, DURATION_BINS, labels=DURATION_LABELS)."""
+    casos = []
+    for ini, fim, label in zip(DURATION_BINS[:-1], DURATION_BINS[1:], DURATION_LABELS):
+        cond = f"{coluna} > {ini}" if fim == float('inf') else f"{coluna} > {ini} AND {coluna} <= {fim}"
+        casos.append(f"WHEN {cond} THEN '{label}'")
+    return f"CASE {' '.join(casos)} END"
+
+# Coluna do DataFrame -> expressão equivalente no star schema
+DIMENSOES_SQL = {
+    'country': 'c.country_code',
+    'platform': 'p.name',
+    'category': 'cat.name',
+    'device_type': 'd.device_type',
+    'region': 'r.name',
+    'year_month': 't.year_month',
+    'upload_hour': 'v.upload_hour',
+    'publish_dayofweek': 'v.publish_dayofweek',
+    'duration_bin': expr_duration_bin(),
+}
+METRICAS_SQL = {
+    'row_id': 'v.row_id', 'views': 'v.views', 'likes': 'v.likes',
+    'engagement_rate': 'v.engagement_rate', 'engagement_total': 'v.engagement_total',
+}
@@ -0,0 +1,53 @@
+# test_etl_carga.py
+# Volta do backend load_data para to_sql: só quando o LOAD DATA LOCAL é recusado
+# Uso: python -m unittest discover -s tests   (ou pytest tests)
+import os
+import sys
+import unittest
+from unittest import mock
+
+import pandas as pd
+import pymysql
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(RAIZ, "restore_dw"))
+os.environ.setdefault("ETL_DB_URL", "sqlite://")
+
+import etl
+
+def erro_mysql(classe, codigo, mensagem):
+    driver = getattr(pymysql.err, classe.__name__)(codigo, mensagem)
+    return classe("LOAD DATA LOCAL INFILE ...", {}, driver)
+
+class TestGravarTabela(unittest.TestCase):
+    def setUp(self):
+        self.df = pd.DataFrame({'video_id': [1, 2], 'tag_id': [3, 4]})
+        carga = mock.patch.dict(etl.CARGA, backend='load_data', load_data_disponivel=True)
+        carga.start()
+        self.addCleanup(carga.stop)
+
+    def test_recusa_do_local_infile_volta_para_to_sql(self):
+        for codigo in sorted(etl.ERROS_LOCAL_INFILE):
+            with self.subTest(codigo=codigo):
+                etl.CARGA['load_data_disponivel'] = True
+                recusa = erro_mysql(OperationalError, codigo, "Loading local data is disabled")
+                with mock.patch.object(etl, 'gravar_load_data', side_effect=recusa), \
+                        mock.patch.object(pd.DataFrame, 'to_sql') as to_sql:
+                    etl.gravar_tabela(self.df, 'bridge_video_tag')
+                to_sql.assert_called_once()
+                self.assertFalse(etl.CARGA['load_data_disponivel'])
+
+    def test_outros_erros_sobem(self):
+        for erro in (erro_mysql(IntegrityError, 1062, "Duplicate entry"),
+                     erro_mysql(OperationalError, 2013, "Lost connection to MySQL server during query")):
+            with self.subTest(erro=str(erro.orig)):
+                with mock.patch.object(etl, 'gravar_load_data', side_effect=erro), \
+                        mock.patch.object(pd.DataFrame, 'to_sql') as to_sql:
+                    with self.assertRaises(type(erro)):
+                        etl.gravar_tabela(self.df, 'bridge_video_tag')
+                to_sql.assert_not_called()
+                self.assertTrue(etl.CARGA['load_data_disponivel'])
+
+if __name__ == "__main__":
+    unittest.main()
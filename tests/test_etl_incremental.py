@@ -0,0 +1,92 @@
+# test_etl_incremental.py
+# Carga incremental do etl.py num SQLite com o star schema do bench_etl (linhas alteradas, datas irrecuperáveis)
+# Uso: python -m unittest discover -s tests   (ou pytest tests)
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+import uuid
+
+import numpy as np
+from sqlalchemy import create_engine, text
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESTORE_DW = os.path.join(RAIZ, "restore_dw")
+sys.path.insert(0, RESTORE_DW)
+# bench_etl importa o etl, que conecta ao ser importado: aponta para um SQLite descartável
+os.environ.setdefault("ETL_DB_URL", "sqlite://")
+
+from bench_etl import LOG_DIR, gerar_bloco, preparar_sqlite
+
+LINHAS = 200
+
+class TestIncremental(unittest.TestCase):
+    def setUp(self):
+        self.pasta = tempfile.mkdtemp()
+        self.csv = os.path.join(self.pasta, "dados.csv")
+        banco = os.path.join(self.pasta, "dw.db")
+        preparar_sqlite(banco)
+        self.url = f"sqlite:///{banco}"
+        self.engine = create_engine(self.url)
+        self.df = gerar_bloco(0, LINHAS, LINHAS, np.random.default_rng(7))
+        self.df.to_csv(self.csv, index=False)
+        self.rodar_etl("--completo")
+
+    def tearDown(self):
+        self.engine.dispose()
+        shutil.rmtree(self.pasta)
+
+    def rodar_etl(self, *args):
+        run_id = f"teste_{uuid.uuid4().hex}"
+        subprocess.run([sys.executable, os.path.join(RESTORE_DW, "etl.py"), "--csv", self.csv, "--run-id", run_id, *args],
+                       env={**os.environ, "ETL_DB_URL": self.url}, check=True, stdout=subprocess.DEVNULL)
+        caminho = os.path.join(LOG_DIR, f"etl_run_{run_id}.json")
+        with open(caminho, encoding="utf-8") as f:
+            log = json.load(f)
+        os.remove(caminho)
+        return log
+
+    def bridges(self, row_id):
+        with self.engine.connect() as conn:
+            return {t: conn.execute(text(f"""
+                        SELECT COUNT(*) FROM {t} b JOIN fact_video v ON v.video_id = b.video_id WHERE v.row_id = :r
+                    """), {"r": row_id}).scalar()
+                    for t in ("bridge_video_tag", "bridge_video_hashtag")}
+
+    def test_data_irrecuperavel_mantem_fato_e_bridges(self):
+        row_id = self.df.loc[8, "row_id"]
+        antes = self.bridges(row_id)
+        self.assertGreater(antes["bridge_video_tag"], 0)
+
+        self.df.loc[8, "publish_date_approx"] = "2025-02-30"
+        self.df.loc[3, "views"] += 1  # outra linha alterada no mesmo chunk: a limpeza de bridges roda
+        self.df.to_csv(self.csv, index=False)
+        log = self.rodar_etl()
+        self.assertEqual(log["totais"]["alteradas"], 1)
+        with self.engine.connect() as conn:
+            self.assertEqual(conn.execute(text("SELECT COUNT(*) FROM fact_video WHERE row_id = :r"), {"r": row_id}).scalar(), 1)
+        self.assertEqual(self.bridges(row_id), antes)
+
+        # O hash da linha descartada foi registrado: a próxima execução não a vê como alterada de novo
+        log = self.rodar_etl()
+        self.assertEqual(log["status"], "sem_mudanca")
+        self.assertEqual(log["totais"]["sem_mudanca"], LINHAS)
+
+    def test_alterada_regrava_bridges(self):
+        row_id = self.df.loc[3, "row_id"]
+        self.df.loc[3, "tags"] = "tag_nova_a, tag_nova_b"
+        self.df.to_csv(self.csv, index=False)
+        log = self.rodar_etl()
+        self.assertEqual(log["totais"]["alteradas"], 1)
+        with self.engine.connect() as conn:
+            tags = conn.execute(text("""
+                SELECT t.tag FROM bridge_video_tag b JOIN dim_tag t ON t.tag_id = b.tag_id
+                JOIN fact_video v ON v.video_id = b.video_id WHERE v.row_id = :r ORDER BY t.tag
+            """), {"r": row_id}).scalars().all()
+        self.assertEqual(tags, ["tag_nova_a", "tag_nova_b"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,37 @@
+# test_filtros.py
+# Índice de bitsets da barra lateral: mesmas opções e linhas que unique()/isin() sobre o DataFrame
+# Uso: python -m unittest discover -s tests   (ou pytest tests)
+import os
+import sys
+import unittest
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from filtros import IndiceFiltro
+
+class TestIndiceFiltro(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(3)
+        paises = pd.Categorical(rng.choice(['BR', 'US', 'JP'], 500), categories=['AR', 'BR', 'JP', 'MX', 'US'])
+        self.df = pd.DataFrame({'country': paises, 'platform': rng.choice(['TikTok', 'YouTube', None], 500)})
+        self.indice = IndiceFiltro(self.df, ['country', 'platform'])
+
+    def test_valores_so_com_linhas(self):
+        # AR e MX existem como categoria do snapshot, mas não têm linhas: não viram opção da barra lateral
+        self.assertEqual(self.indice.valores('country'), ['BR', 'JP', 'US'])
+        self.assertEqual(self.indice.valores('platform'), sorted(self.df['platform'].dropna().unique()))
+
+    def test_mascara_igual_ao_isin(self):
+        for selecao in ({'country': ['BR']}, {'country': ['BR', 'US'], 'platform': ['YouTube']}):
+            with self.subTest(selecao=selecao):
+                esperado = np.logical_and.reduce([self.df[d].isin(v).to_numpy() for d, v in selecao.items()])
+                np.testing.assert_array_equal(self.indice.mascara(selecao), esperado)
+
+    def test_todas_as_opcoes_nao_filtram(self):
+        self.assertTrue(self.indice.mascara({'country': self.indice.valores('country')}).all())
+
+if __name__ == "__main__":
+    unittest.main()
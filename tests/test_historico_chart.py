@@ -0,0 +1,69 @@
+# test_historico_chart.py
+# Histórico do chart e vínculo som -> hit gravados pelo atualizar_dw (SQLite no lugar do MySQL)
+# Uso: python -m unittest discover -s tests   (ou pytest tests)
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from datetime import date
+from unittest import mock
+
+from sqlalchemy import create_engine, text
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.join(RAIZ, "scrapers"))
+os.environ.setdefault("DB_CREDENTIALS", json.dumps({"user": "u", "password": "p", "host": "h", "port": 3306, "database": "d"}))
+
+import music_charts_history as mch
+from historico_chart import rank_do_som_em
+
+def chart(*nomes):
+    return [{"musica_limpa": n, "rank": i + 1} for i, n in enumerate(nomes)]
+
+class TestHistoricoChart(unittest.TestCase):
+    def setUp(self):
+        self.pasta = tempfile.mkdtemp()
+        self.engine = create_engine(f"sqlite:///{os.path.join(self.pasta, 'dw.db')}")
+        with self.engine.begin() as conn:
+            conn.execute(text("CREATE TABLE dim_sound (sound_id INTEGER PRIMARY KEY, music_track TEXT, "
+                              "is_global_hit INTEGER DEFAULT 0, chart_rank INTEGER)"))
+            conn.execute(text("INSERT INTO dim_sound (music_track) VALUES "
+                              "('Espresso'), ('espresso (sped up)'), ('original sound'), ('APT.')"))
+        cache = mock.patch.multiple(mch, MATCH_CACHE=os.path.join(self.pasta, "cache.json.gz"), MATCH_WORKERS=1)
+        cache.start()
+        self.addCleanup(cache.stop)
+
+    def tearDown(self):
+        self.engine.dispose()
+        shutil.rmtree(self.pasta)
+
+    def ranks(self, data):
+        with self.engine.connect() as conn:
+            return [rank_do_som_em(conn, som, data) for som in (1, 2, 3, 4)]
+
+    def test_rank_do_som_no_chart_vigente(self):
+        mch.atualizar_dw(self.engine, chart("espresso", "apt", "birds of a feather"), date(2026, 1, 1))
+        mch.atualizar_dw(self.engine, chart("apt", "birds of a feather"), date(2026, 1, 3))
+        self.assertEqual(self.ranks(date(2025, 12, 31)), [None, None, None, None])
+        self.assertEqual(self.ranks(date(2026, 1, 1)), [1, 1, None, 2])
+        self.assertEqual(self.ranks(date(2026, 1, 2)), [1, 1, None, 2])
+        self.assertEqual(self.ranks(date(2026, 1, 3)), [None, None, None, 1])
+
+    def test_sincronizacao_com_falha_nao_grava_o_dia(self):
+        mch.atualizar_dw(self.engine, chart("espresso", "apt"), date(2026, 1, 1))
+        with mock.patch.object(mch, "gravar_sons_do_dia", side_effect=RuntimeError("conexão perdida")):
+            with self.assertRaises(RuntimeError):
+                mch.atualizar_dw(self.engine, chart("apt", "espresso"), date(2026, 1, 2))
+        with self.engine.connect() as conn:
+            dias = conn.execute(text("SELECT DISTINCT chart_date FROM fact_chart_history")).scalars().all()
+            dim = conn.execute(text("SELECT chart_rank FROM dim_sound ORDER BY sound_id")).scalars().all()
+        self.assertEqual(dias, ["2026-01-01"])
+        self.assertEqual(dim, [1, 1, None, 2])
+        # A consulta do dia da falha cai no último chart sincronizado, não num dia sem vínculos
+        self.assertEqual(self.ranks(date(2026, 1, 2)), [1, 1, None, 2])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,142 @@
+# test_music_charts_history.py
+# Extração do chart do kworb (paridade com a versão BeautifulSoup) e GET condicional do baixar_chart
+# Uso: python -m unittest discover -s tests   (ou pytest tests)
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES = os.path.join(RAIZ, "tests", "fixtures", "kworb")
+sys.path.insert(0, os.path.join(RAIZ, "scrapers"))
+# O módulo encerra o processo ao ser importado sem credenciais; nenhum teste abre conexão
+os.environ.setdefault("DB_CREDENTIALS", json.dumps({"user": "u", "password": "p", "host": "h", "port": 3306, "database": "d"}))
+
+import music_charts_history as mch
+
+def ler_fixture(nome):
+    with open(os.path.join(FIXTURES, nome), encoding="utf-8") as f:
+        return f.read()
+
+class TestExtrairHits(unittest.TestCase):
+    """esperado_bs4.json foi gerado com o extrair_hits_do_html antigo (BeautifulSoup, html.parser)."""
+
+    @classmethod
+    def setUpClass(cls):
+        with open(os.path.join(FIXTURES, "esperado_bs4.json"), encoding="utf-8") as f:
+            cls.esperado = json.load(f)
+
+    def test_igual_ao_bs4(self):
+        for nome in ("global_daily.html", "global_daily2.html", "pequeno.html", "sem_tabela.html", "script_na_celula.html"):
+            with self.subTest(fixture=nome):
+                self.assertEqual(mch.extrair_hits_do_html(ler_fixture(nome)), self.esperado[nome])
+
+    def test_script_e_style_na_celula_ficam_de_fora(self):
+        # Como no get_text do bs4: o texto de <script>/<style> não entra no nome da música
+        hits = mch.extrair_hits_do_html(ler_fixture("script_na_celula.html"))
+        self.assertEqual([h["musica_limpa"] for h in hits], ["espresso", "birds of a feather", "apt"])
+
+    def test_tabela_aninhada_na_celula(self):
+        hits = mch.extrair_hits_do_html(ler_fixture("tabela_aninhada.html"))
+        bs4 = self.esperado["tabela_aninhada.html"]
+        # O texto da tabela interna entra na célula, como no bs4...
+        self.assertEqual(hits[0], bs4[0])
+        # ...mas as linhas dela não viram posições do chart (o bs4 gerava um hit fantasma no rank 2),
+        # e a tabela depois do chart não é lida
+        self.assertEqual(hits, [{"musica_limpa": "interna lady gaga  die with a smile", "rank": 1},
+                                {"musica_limpa": "luther with sza", "rank": 2}])
+        self.assertEqual(bs4[1], {"musica_limpa": "interna", "rank": 2})
+
+class ServidorChart(BaseHTTPRequestHandler):
+    """Serve `corpo`; com `etag` ligado responde 304 ao If-None-Match certo, como o kworb."""
+    corpo = b""
+    etag = True
+    pedidos = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        classe = type(self)
+        classe.pedidos.append(dict(self.headers))
+        etag = '"%s"' % hashlib.md5(classe.corpo).hexdigest()
+        if classe.etag and self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        if classe.etag:
+            self.send_header("ETag", etag)
+            self.send_header("Last-Modified", "Mon, 01 Sep 2025 00:00:00 GMT")
+        self.send_header("Content-Length", str(len(classe.corpo)))
+        self.end_headers()
+        self.wfile.write(classe.corpo)
+
+class TestBaixarChart(unittest.TestCase):
+    def setUp(self):
+        ServidorChart.corpo = ler_fixture("global_daily.html").encode("utf-8")
+        ServidorChart.etag = True
+        ServidorChart.pedidos = []
+        self.servidor = HTTPServer(("127.0.0.1", 0), ServidorChart)
+        threading.Thread(target=self.servidor.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.servidor.server_port}/global_daily.html"
+        self.pasta = tempfile.mkdtemp()
+        self.caminho_estado = os.path.join(self.pasta, "cache", "kworb_estado.json")
+
+    def tearDown(self):
+        self.servidor.shutdown()
+        self.servidor.server_close()
+        shutil.rmtree(self.pasta)
+
+    def sincronizar(self):
+        """Um ciclo do __main__: baixa, extrai se mudou e grava o estado."""
+        html, estado = mch.baixar_chart(self.url, self.caminho_estado)
+        mch.salvar_estado(self.caminho_estado, estado)
+        return html, estado
+
+    def test_200_na_primeira_execucao(self):
+        html, estado = self.sincronizar()
+        self.assertEqual(len(mch.extrair_hits_do_html(html)), 184)
+        self.assertEqual(estado["sha256"], hashlib.sha256(ServidorChart.corpo).hexdigest())
+        self.assertIsNotNone(estado["etag"])
+        self.assertNotIn("If-None-Match", ServidorChart.pedidos[0])
+
+    def test_304_sem_mudanca(self):
+        _, estado = self.sincronizar()
+        html, estado_304 = self.sincronizar()
+        self.assertIsNone(html)
+        self.assertEqual(estado_304, estado)
+        self.assertEqual(ServidorChart.pedidos[-1]["If-None-Match"], estado["etag"])
+        self.assertEqual(ServidorChart.pedidos[-1]["If-Modified-Since"], "Mon, 01 Sep 2025 00:00:00 GMT")
+
+    def test_mesmo_hash_sem_304(self):
+        ServidorChart.etag = False  # servidor que nunca responde 304
+        self.sincronizar()
+        html, estado = self.sincronizar()
+        self.assertIsNone(html)
+        self.assertEqual(estado["sha256"], hashlib.sha256(ServidorChart.corpo).hexdigest())
+
+    def test_conteudo_novo(self):
+        for etag in (True, False):
+            with self.subTest(etag=etag):
+                ServidorChart.etag = etag
+                ServidorChart.corpo = ler_fixture("global_daily.html").encode("utf-8")
+                self.sincronizar()
+                ServidorChart.corpo = ler_fixture("global_daily2.html").encode("utf-8")
+                html, estado = self.sincronizar()
+                self.assertIsNotNone(html)
+                self.assertEqual(mch.extrair_hits_do_html(html)[:3], [
+                    {"musica_limpa": "ordinary", "rank": 1},
+                    {"musica_limpa": "birds of a feather", "rank": 2},
+                    {"musica_limpa": "its ok im ok", "rank": 3},
+                ])
+                self.assertEqual(estado["sha256"], hashlib.sha256(ServidorChart.corpo).hexdigest())
+
+if __name__ == "__main__":
+    unittest.main()
@@ -134,7 +134,8 @@ def atualizar_layout_grafico(fig):
     return fig
 
 def plotar_grafico_linha(df, x_col, y_col, agg_func, titulo, cor=PRIMARY_COLOR, zoom_inteligente=False, formato_eixo=None, **kwargs):
-    df_agg = df.groupby(x_col)[y_col].agg(agg_func).reset_index()
+    # agg_func=None indica que df já chega agregado por x_col
+    df_agg = df.groupby(x_col, observed=True)[y_col].agg(agg_func).reset_index() if agg_func else df
     kwargs.setdefault("labels", LABELS_PT)
     fig = px.line(df_agg, x=x_col, y=y_col, markers=True, title=titulo, color_discrete_sequence=[cor], **kwargs)
     fig.update_traces(line=dict(width=3), marker=dict(size=8, line=dict(width=2, color='white')))